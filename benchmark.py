@@ -0,0 +1,802 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import proxy_simple
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class FakeProxyFarm:
+    def __init__(self, count, mix, blackhole_rate, reset_rate, error_rate, latency_ms, jitter_ms, seed,
+                 slow_rate=0.0, slow_ms=500):
+        self.count = count
+        self.mix = mix
+        self.blackhole_rate = blackhole_rate
+        self.reset_rate = reset_rate
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_ms = slow_ms
+        self.rng = random.Random(seed)
+        self.judge_port = None
+        self.proxies = {}
+
+    def _pick_behaviour(self):
+        roll = self.rng.random()
+        if roll < self.blackhole_rate:
+            return 'blackhole'
+        roll -= self.blackhole_rate
+        if roll < self.reset_rate:
+            return 'reset'
+        roll -= self.reset_rate
+        if roll < self.error_rate:
+            return 'error'
+        roll -= self.error_rate
+        if roll < self.slow_rate:
+            return 'slow'
+        return 'ok'
+
+    async def _delay(self, behaviour=None):
+        delay = self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if behaviour == 'slow':
+            delay += self.slow_ms
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    async def _handle_judge(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip()] = value.strip()
+
+                body = json.dumps({
+                    "origin": writer.get_extra_info('peername')[0],
+                    "headers": headers
+                }).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body) + body)
+                await writer.drain()
+                if headers.get('Connection', '').lower() == 'close':
+                    return
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _pipe(self, reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def _relay(self, reader, writer, host, port):
+        upstream_reader, upstream_writer = await asyncio.open_connection(host, port)
+        await asyncio.gather(self._pipe(reader, upstream_writer), self._pipe(upstream_reader, writer))
+
+    async def _serve_http(self, reader, writer, behaviour):
+        request_line = await reader.readline()
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line)
+
+        parts = request_line.decode('latin-1').split()
+        await self._delay(behaviour)
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            return
+        if behaviour == 'error':
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            return
+
+        method, target, version = parts
+        if method == 'CONNECT':
+            host, port = target.rsplit(':', 1)
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            await self._relay(reader, writer, host, int(port))
+            return
+
+        target = target.split('://', 1)[-1]
+        host_port, _, path = target.partition('/')
+        host, _, port = host_port.partition(':')
+        upstream_reader, upstream_writer = await asyncio.open_connection(host, int(port or 80))
+        upstream_writer.write(f"{method} /{path} {version}\r\n".encode() + b"".join(header_lines) + b"\r\n")
+        await asyncio.gather(self._pipe(reader, upstream_writer), self._pipe(upstream_reader, writer))
+
+    async def _serve_socks4(self, reader, writer, behaviour):
+        header = await reader.readexactly(8)
+        if header[0] != 4:
+            return
+        while (await reader.readexactly(1)) != b'\x00':
+            pass
+        port = struct.unpack('>H', header[2:4])[0]
+        host = socket.inet_ntoa(header[4:8])
+        await self._delay(behaviour)
+        if behaviour == 'error':
+            writer.write(b'\x00\x5b' + b'\x00' * 6)
+            return
+        writer.write(b'\x00\x5a' + b'\x00' * 6)
+        await self._relay(reader, writer, host, port)
+
+    async def _serve_socks5(self, reader, writer, behaviour):
+        greeting = await reader.readexactly(2)
+        if greeting[0] != 5:
+            return
+        await reader.readexactly(greeting[1])
+        await self._delay(behaviour)
+        writer.write(b'\x05\x00')
+        await writer.drain()
+
+        request = await reader.readexactly(4)
+        if request[0] != 5:
+            return
+        if request[3] == 1:
+            host = socket.inet_ntoa(await reader.readexactly(4))
+        elif request[3] == 3:
+            length = (await reader.readexactly(1))[0]
+            host = (await reader.readexactly(length)).decode()
+        else:
+            host = socket.inet_ntop(socket.AF_INET6, await reader.readexactly(16))
+        port = struct.unpack('>H', await reader.readexactly(2))[0]
+
+        if behaviour == 'error':
+            writer.write(b'\x05\x05\x00\x01' + b'\x00' * 6)
+            return
+        writer.write(b'\x05\x00\x00\x01' + b'\x00' * 6)
+        await self._relay(reader, writer, host, port)
+
+    def _make_handler(self, protocol, behaviour):
+        async def handler(reader, writer):
+            try:
+                if behaviour == 'blackhole':
+                    await reader.read()
+                    return
+                if behaviour == 'reset':
+                    sock = writer.get_extra_info('socket')
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                    return
+                if protocol == 'socks4':
+                    await self._serve_socks4(reader, writer, behaviour)
+                elif protocol == 'socks5':
+                    await self._serve_socks5(reader, writer, behaviour)
+                else:
+                    await self._serve_http(reader, writer, behaviour)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                pass
+            finally:
+                writer.close()
+        return handler
+
+    async def start(self):
+        judge = await asyncio.start_server(self._handle_judge, '127.0.0.1', 0, backlog=1024)
+        self.judge_port = judge.sockets[0].getsockname()[1]
+
+        for _ in range(self.count):
+            protocol = self.rng.choice(self.mix)
+            behaviour = self._pick_behaviour()
+            server = await asyncio.start_server(self._make_handler(protocol, behaviour),
+                                                '127.0.0.1', 0, backlog=256)
+            port = server.sockets[0].getsockname()[1]
+            self.proxies[f"127.0.0.1:{port}"] = (protocol, behaviour)
+
+
+def _run_farm(conn, options):
+    _raise_fd_limit()
+    farm = FakeProxyFarm(**options)
+
+    async def serve():
+        await farm.start()
+        conn.send((farm.judge_port, farm.proxies))
+        while True:
+            await asyncio.sleep(3600)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def _raise_fd_limit():
+    proxy_simple._raise_fd_limit()
+
+
+class TimedProxyChecker(proxy_simple.ProxyChecker):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def _check_proxy_types(self, proxy, proxy_types, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super()._check_proxy_types(proxy, proxy_types, *args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def _async_check_proxy_types(self, proxy, proxy_types, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super()._async_check_proxy_types(proxy, proxy_types, *args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+class ResourceSampler:
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_fds = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _count_fds(self):
+        try:
+            return len(os.listdir('/proc/self/fd'))
+        except OSError:
+            return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_fds = max(self.peak_fds, self._count_fds())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_benchmark(args):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    farm = multiprocessing.Process(target=_run_farm, args=(child_conn, _farm_options(args)), daemon=True)
+    farm.start()
+    judge_port, farm_proxies = parent_conn.recv()
+    expected_valid = sum(1 for protocol, behaviour in farm_proxies.values() if behaviour in ('ok', 'slow'))
+
+    print(f"[Bench] Farm: {len(farm_proxies)} proxies ({expected_valid} healthy), judge on port {judge_port}")
+
+    _raise_fd_limit()
+    workdir = tempfile.mkdtemp(prefix="proxy-bench-")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        checker = TimedProxyChecker(output_file=os.path.join(workdir, "proxies.json"),
+                                    max_threads=args.threads, engine=args.engine,
+                                    sniff=not args.no_sniff, adaptive=args.adaptive, race=args.race)
+        checker.judge_url = f"http://127.0.0.1:{judge_port}/ip"
+        proxy_types = ['http', 'https', 'socks4', 'socks5']
+        proxy_list = list(farm_proxies)
+
+        sampler = ResourceSampler()
+        sampler.start()
+        start = time.perf_counter()
+        if args.entry == 'file':
+            list_path = os.path.join(workdir, "proxies.txt")
+            with open(list_path, "w") as f:
+                f.write("".join(f"{proxy}\n" for proxy in proxy_list))
+            checker.check_from_file(list_path, proxy_types, False)
+        else:
+            checker.scraped_count = len(proxy_list)
+            checker._process_proxy_batch(proxy_list, proxy_types, False)
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+    finally:
+        os.chdir(previous_cwd)
+        farm.terminate()
+        farm.join()
+
+    result = {
+        "engine": args.engine,
+        "adaptive": args.adaptive,
+        "race": args.race,
+        "entry": args.entry,
+        "proxies": len(proxy_list),
+        "checked": checker.checked_count,
+        "valid": checker.valid_count,
+        "expected_valid": expected_valid,
+        "seconds": round(elapsed, 3),
+        "checks_per_sec": round(checker.checked_count / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(checker.latencies, 0.50) * 1000, 1),
+        "p99_ms": round(_percentile(checker.latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_threads": sampler.peak_threads,
+        "peak_fds": sampler.peak_fds
+    }
+
+    print(f"\n[Bench] Engine: {result['engine']} | Entry: {result['entry']} | Proxies: {result['proxies']}")
+    print(f"[Bench] Checked: {result['checked']} | Valid: {result['valid']}/{result['expected_valid']}")
+    print(f"[Bench] Wall time: {result['seconds']}s | Checks/sec: {result['checks_per_sec']}")
+    print(f"[Bench] Check latency p50: {result['p50_ms']}ms | p99: {result['p99_ms']}ms")
+    print(f"[Bench] Peak RSS: {result['peak_rss_mb']}MB | Peak threads: {result['peak_threads']} | "
+          f"Peak fds: {result['peak_fds']}")
+    if checker.controller:
+        print(f"[Bench] Adaptive: {checker.controller.stats()}")
+
+    if args.json:
+        with open(args.json, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+    return result
+
+
+def _farm_options(args):
+    return {
+        "count": args.proxies,
+        "mix": args.mix.split(','),
+        "blackhole_rate": args.blackhole_rate,
+        "reset_rate": args.reset_rate,
+        "error_rate": args.error_rate,
+        "slow_rate": args.slow_rate,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "slow_ms": args.slow_ms,
+        "seed": args.seed
+    }
+
+
+JUDGE_REQUEST = b"GET /ip HTTP/1.1\r\nHost: judge\r\nConnection: close\r\n\r\n"
+
+
+async def _fetch_judge(reader, writer, timeout):
+    writer.write(JUDGE_REQUEST)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), timeout)
+    return response.startswith(b'HTTP/1.1 200')
+
+
+async def _fetch_via_gateway(gateway_port, judge_port, timeout):
+    reader, writer = await asyncio.open_connection('127.0.0.1', gateway_port)
+    try:
+        writer.write(f"CONNECT 127.0.0.1:{judge_port} HTTP/1.1\r\nHost: 127.0.0.1:{judge_port}\r\n\r\n".encode())
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+        if head.split(None, 2)[1] != b'200':
+            return False
+        return await _fetch_judge(reader, writer, timeout)
+    finally:
+        writer.close()
+
+
+async def _fetch_via_random(connector, entries, judge_port, attempts, timeout):
+    for _ in range(attempts):
+        try:
+            reader, writer = await asyncio.wait_for(
+                connector._connect_via(random.choice(entries), '127.0.0.1', judge_port, None), timeout)
+        except Exception:
+            continue
+        try:
+            return await _fetch_judge(reader, writer, timeout)
+        finally:
+            writer.close()
+    return False
+
+
+async def _drive_requests(fetch, count, concurrency):
+    latencies = []
+    succeeded = 0
+    remaining = count
+
+    async def worker():
+        nonlocal remaining, succeeded
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                ok = await fetch()
+            except Exception:
+                ok = False
+            succeeded += bool(ok)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return succeeded, latencies, time.perf_counter() - start
+
+
+def run_gateway_benchmark(args):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    farm = multiprocessing.Process(target=_run_farm, args=(child_conn, _farm_options(args)), daemon=True)
+    farm.start()
+    judge_port, farm_proxies = parent_conn.recv()
+    healthy = sum(1 for protocol, behaviour in farm_proxies.values() if behaviour in ('ok', 'slow'))
+    print(f"[Bench] Farm: {len(farm_proxies)} proxies ({healthy} healthy), judge on port {judge_port}")
+
+    _raise_fd_limit()
+    workdir = tempfile.mkdtemp(prefix="proxy-bench-")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        checker = proxy_simple.ProxyChecker(output_file=os.path.join(workdir, "proxies.json"))
+        entries = [f"{protocol}://{proxy}" for proxy, (protocol, behaviour) in farm_proxies.items()]
+        for entry in entries:
+            checker.store.add(entry)
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            gateway_port = probe.getsockname()[1]
+        gateway = proxy_simple.ProxyGateway(checker, host='127.0.0.1', port=gateway_port,
+                                            max_connections=args.gateway_max_conns, retries=args.gateway_retries,
+                                            connect_timeout=args.gateway_timeout)
+        checker.gateway = gateway
+        threading.Thread(target=asyncio.run, args=(gateway.serve(),), daemon=True).start()
+        time.sleep(0.5)
+
+        attempts = args.gateway_retries + 1
+        connector = proxy_simple.ProxyGateway(checker, connect_timeout=args.gateway_timeout)
+        runs = {
+            "random": lambda: _fetch_via_random(connector, entries, judge_port, attempts, args.gateway_timeout),
+            "gateway": lambda: _fetch_via_gateway(gateway_port, judge_port, args.gateway_timeout * attempts)
+        }
+        results = []
+        for name, fetch in runs.items():
+            succeeded, latencies, elapsed = asyncio.run(_drive_requests(fetch, args.gateway_requests, args.concurrency))
+            row = {
+                "routing": name,
+                "requests": args.gateway_requests,
+                "succeeded": succeeded,
+                "seconds": round(elapsed, 3),
+                "requests_per_sec": round(args.gateway_requests / elapsed, 1) if elapsed else 0.0,
+                "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+                "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1)
+            }
+            results.append(row)
+            print(f"[Bench] {name:<8} ok: {row['succeeded']}/{row['requests']} | {row['requests_per_sec']} req/s | "
+                  f"p50: {row['p50_ms']}ms | p99: {row['p99_ms']}ms")
+        print(f"[Bench] Gateway: {gateway.stats()} | Store: {checker.store.count()}/{len(entries)} upstreams left")
+    finally:
+        os.chdir(previous_cwd)
+        farm.terminate()
+        farm.join()
+
+    if args.json:
+        with open(args.json, "a") as f:
+            for row in results:
+                f.write(json.dumps(row) + "\n")
+    return results
+
+
+def _busy_loop():
+    while True:
+        sum(range(1000))
+        time.sleep(0.001)
+
+
+def _run_api_server(conn, server_type, entries, background_threads, seed):
+    sys.stdout = open(os.devnull, "w")
+    _raise_fd_limit()
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix="proxy-bench-")
+    os.chdir(workdir)
+    checker = proxy_simple.ProxyChecker(output_file=os.path.join(workdir, "proxies.json"))
+    for i in range(entries):
+        checker.store.add(f"http://10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:8080", {"total": rng.random()})
+    checker.store.flush()
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    for _ in range(background_threads):
+        threading.Thread(target=_busy_loop, daemon=True).start()
+    threading.Thread(target=proxy_simple.start_web_server, args=(port, checker, server_type), daemon=True).start()
+    time.sleep(0.5)
+    conn.send(port)
+    while True:
+        time.sleep(3600)
+
+
+async def _api_get(connection, port, path):
+    reader, writer = connection or await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept-Encoding: gzip\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    headers = head.decode('latin-1').lower()
+    length = re.search(r'content-length: (\d+)', headers)
+    if length:
+        await reader.readexactly(int(length.group(1)))
+    else:
+        await reader.read()
+
+    ok = head.split(None, 2)[1] == b'200'
+    if 'connection: close' in headers:
+        writer.close()
+        return None, ok
+    return (reader, writer), ok
+
+
+async def _drive_api(port, path, count, concurrency):
+    latencies = []
+    succeeded = 0
+    remaining = count
+
+    async def worker():
+        nonlocal remaining, succeeded
+        connection = None
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                connection, ok = await asyncio.wait_for(_api_get(connection, port, path), 30)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                connection, ok = None, False
+            succeeded += ok
+            latencies.append(time.perf_counter() - start)
+        if connection:
+            connection[1].close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return succeeded, latencies, time.perf_counter() - start
+
+
+def run_api_benchmark(args):
+    _raise_fd_limit()
+    print(f"[Bench] API servers: {args.api_requests} x GET {args.api_path} from {args.concurrency} clients, "
+          f"{args.api_entries} stored proxies, {args.api_background_threads} busy background threads")
+    results = []
+    for server_type in ('thread', 'async'):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        server = multiprocessing.Process(target=_run_api_server, daemon=True,
+                                         args=(child_conn, server_type, args.api_entries,
+                                               args.api_background_threads, args.seed))
+        server.start()
+        port = parent_conn.recv()
+        try:
+            succeeded, latencies, elapsed = asyncio.run(
+                _drive_api(port, args.api_path, args.api_requests, args.concurrency))
+        finally:
+            server.terminate()
+            server.join()
+
+        row = {
+            "server": server_type,
+            "requests": args.api_requests,
+            "succeeded": succeeded,
+            "seconds": round(elapsed, 3),
+            "requests_per_sec": round(args.api_requests / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1)
+        }
+        results.append(row)
+        print(f"[Bench] {server_type:<6} ok: {row['succeeded']}/{row['requests']} | {row['requests_per_sec']} req/s | "
+              f"p50: {row['p50_ms']}ms | p99: {row['p99_ms']}ms")
+
+    if args.json:
+        with open(args.json, "a") as f:
+            for row in results:
+                f.write(json.dumps(row) + "\n")
+    return results
+
+
+LEGACY_IP_PORT_PATTERN = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}:\d{2,5}$')
+
+
+def _legacy_parse_proxy_lines(body):
+    found = []
+    for line in body.decode('utf-8', errors='replace').splitlines():
+        line = line.strip()
+        if LEGACY_IP_PORT_PATTERN.match(line) and not line.startswith("127"):
+            found.append(line)
+    return found
+
+
+def _synthetic_bodies(size_mb, seed):
+    rng = random.Random(seed)
+
+    def address():
+        return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+    def build(make_line, prefix=b"", suffix=b""):
+        lines = []
+        size = len(prefix) + len(suffix)
+        while size < size_mb * 1024 * 1024:
+            line = make_line().encode()
+            lines.append(line)
+            size += len(line) + 1
+        return prefix + b"\n".join(lines) + suffix
+
+    protocols = ['http', 'https', 'socks4', 'socks5']
+    return {
+        "plain": build(lambda: f"{address()}:{rng.randint(80, 65000)}"),
+        "prefixed": build(lambda: f"{rng.choice(protocols)}://{address()}:{rng.randint(80, 65000)}"),
+        "html": build(lambda: f"<tr><td>{address()}</td><td>{rng.randint(80, 65000)}</td><td>Elite</td></tr>",
+                      b"<table>", b"</table>"),
+        "json": json.dumps([{"ip": address(), "port": rng.randint(80, 65000), "protocol": rng.choice(protocols)}
+                            for _ in range(size_mb * 1024 * 1024 // 60)]).encode()
+    }
+
+
+def run_extract_benchmark(args):
+    print(f"[Bench] Extractor micro-benchmark on {args.extract_mb}MB synthetic bodies")
+    results = []
+    for name, body in _synthetic_bodies(args.extract_mb, args.seed).items():
+        row = {"format": name, "bytes": len(body)}
+        for label, parse in (("legacy", _legacy_parse_proxy_lines), ("extractor", proxy_simple.extract_proxies)):
+            start = time.perf_counter()
+            found = parse(body)
+            elapsed = time.perf_counter() - start
+            row[f"{label}_found"] = len(found)
+            row[f"{label}_mb_per_sec"] = round(len(body) / elapsed / 1024 / 1024, 1)
+        results.append(row)
+        print(f"[Bench] {name:<9} legacy: {row['legacy_found']:>8} found, {row['legacy_mb_per_sec']:>6} MB/s | "
+              f"extractor: {row['extractor_found']:>8} found, {row['extractor_mb_per_sec']:>6} MB/s")
+
+    if args.json:
+        with open(args.json, "a") as f:
+            for row in results:
+                f.write(json.dumps(row) + "\n")
+    return results
+
+
+def _synthetic_geo_db(path, ranges, seed):
+    rng = random.Random(seed)
+    bounds = sorted(rng.sample(range(1 << 24, 0xE0000000), ranges * 2))
+    countries = ['US', 'DE', 'FR', 'NL', 'RU', 'CN', 'BR', 'None']
+    with open(path, "w") as f:
+        f.write("range_start\trange_end\tAS_number\tcountry_code\tAS_description\n")
+        for start, end in zip(bounds[::2], bounds[1::2]):
+            f.write(f"{socket.inet_ntoa(struct.pack('!I', start))}\t{socket.inet_ntoa(struct.pack('!I', end))}\t"
+                    f"{rng.randint(0, 65000)}\t{rng.choice(countries)}\tSynthetic\n")
+
+
+def run_geo_benchmark(args):
+    backend = 'numpy' if proxy_simple.numpy is not None else 'array'
+    print(f"[Bench] Geo index: {args.geo_ranges} synthetic ranges, {args.geo_lookups} lookups ({backend} backend)")
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="proxy-bench-") as workdir:
+        path = os.path.join(workdir, "ranges.tsv")
+        _synthetic_geo_db(path, args.geo_ranges, args.seed)
+        start = time.perf_counter()
+        index = proxy_simple.IPRangeIndex.load(path)
+        load_seconds = time.perf_counter() - start
+
+    ips = [socket.inet_ntoa(struct.pack('!I', rng.getrandbits(32))) for _ in range(args.geo_lookups)]
+    start = time.perf_counter()
+    single = [index.lookup(ip) for ip in ips]
+    single_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    bulk = index.lookup_many(ips)
+    bulk_seconds = time.perf_counter() - start
+    assert single == bulk
+
+    row = {
+        "backend": backend,
+        "ranges": len(index),
+        "lookups": len(ips),
+        "matched": sum(1 for country, asn in bulk if country or asn),
+        "load_seconds": round(load_seconds, 3),
+        "single_per_sec": round(len(ips) / single_seconds) if single_seconds else 0,
+        "bulk_per_sec": round(len(ips) / bulk_seconds) if bulk_seconds else 0
+    }
+    print(f"[Bench] Loaded {row['ranges']} ranges in {row['load_seconds']}s | matched {row['matched']}/{row['lookups']}")
+    print(f"[Bench] Per-IP lookup: {row['single_per_sec']}/s | Bulk lookup: {row['bulk_per_sec']}/s")
+
+    if args.json:
+        with open(args.json, "a") as f:
+            f.write(json.dumps(row) + "\n")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline ProxyChecker benchmark against a local fake proxy farm')
+    parser.add_argument('-n','--proxies', type=int, default=1000,
+                       help='Number of fake proxies in the farm (default: 1000)')
+    parser.add_argument('-e','--engine', choices=['thread', 'async'], default='thread',
+                       help='Check engine to benchmark (default: thread)')
+    parser.add_argument('-t','--threads', type=int, default=500,
+                       help='Maximum concurrent checks (default: 500)')
+    parser.add_argument('--entry', choices=['file', 'batch'], default='file',
+                       help='Drive check_from_file or _process_proxy_batch directly (default: file)')
+    parser.add_argument('--mix', default='http,socks4,socks5',
+                       help='Comma-separated protocols served by the farm (default: http,socks4,socks5)')
+    parser.add_argument('--blackhole-rate', type=float, default=0.3,
+                       help='Fraction of proxies that accept and never answer (default: 0.3)')
+    parser.add_argument('--reset-rate', type=float, default=0.2,
+                       help='Fraction of proxies that reset every connection (default: 0.2)')
+    parser.add_argument('--error-rate', type=float, default=0.1,
+                       help='Fraction of proxies that answer but refuse to relay (default: 0.1)')
+    parser.add_argument('--slow-rate', type=float, default=0.0,
+                       help='Fraction of proxies that work but add --slow-ms to every reply (default: 0)')
+    parser.add_argument('--slow-ms', type=float, default=500,
+                       help='Extra latency of the slow proxies (default: 500)')
+    parser.add_argument('--latency-ms', type=float, default=50,
+                       help='Added latency before each proxy reply (default: 50)')
+    parser.add_argument('--jitter-ms', type=float, default=20,
+                       help='Uniform jitter applied to the latency (default: 20)')
+    parser.add_argument('--no-sniff', action='store_true',
+                       help='Disable handshake-based protocol detection in the checker')
+    parser.add_argument('--adaptive', action='store_true',
+                       help='Enable the adaptive concurrency and timeout controller')
+    parser.add_argument('--race', action='store_true',
+                       help='Race the candidate protocols of each proxy instead of trying them in turn')
+    parser.add_argument('--seed', type=int, default=1,
+                       help='Random seed for the farm layout (default: 1)')
+    parser.add_argument('--gateway-requests', type=int,
+                       help='Compare client-side random selection with the forward-proxy gateway over this many requests instead')
+    parser.add_argument('--concurrency', type=int, default=50,
+                       help='Concurrent client requests for --gateway-requests and --api-requests (default: 50)')
+    parser.add_argument('--gateway-max-conns', type=int, default=8,
+                       help='Gateway connections per upstream (default: 8)')
+    parser.add_argument('--gateway-retries', type=int, default=2,
+                       help='Extra upstreams tried per request, also used for random selection (default: 2)')
+    parser.add_argument('--gateway-timeout', type=float, default=2.0,
+                       help='Seconds allowed to open a tunnel through one upstream (default: 2)')
+    parser.add_argument('--api-requests', type=int,
+                       help='Compare the threaded and asyncio API servers over this many requests instead')
+    parser.add_argument('--api-path', default='/get_proxies?limit=100',
+                       help='Path requested by --api-requests (default: /get_proxies?limit=100)')
+    parser.add_argument('--api-entries', type=int, default=5000,
+                       help='Proxies stored in the server for --api-requests (default: 5000)')
+    parser.add_argument('--api-background-threads', type=int, default=0,
+                       help='Busy threads in the server process standing in for checker threads (default: 0)')
+    parser.add_argument('--extract-mb', type=int,
+                       help='Benchmark source body extraction on synthetic bodies of this size instead')
+    parser.add_argument('--geo-lookups', type=int,
+                       help='Benchmark the IP range index over this many random addresses instead')
+    parser.add_argument('--geo-ranges', type=int, default=500000,
+                       help='Synthetic ranges generated for --geo-lookups (default: 500000)')
+    parser.add_argument('--json', help='Append the result as a JSON line to this file')
+
+    args = parser.parse_args()
+    if args.extract_mb:
+        run_extract_benchmark(args)
+    elif args.geo_lookups:
+        run_geo_benchmark(args)
+    elif args.gateway_requests:
+        run_gateway_benchmark(args)
+    elif args.api_requests:
+        run_api_benchmark(args)
+    else:
+        run_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,336 +1,3610 @@
 import requests
 import re
+import asyncio
+import socket
+import selectors
+import errno
+import ssl
+import struct
 import threading
 from threading import Lock, BoundedSemaphore
 import time
 import argparse
+from http import HTTPStatus
 from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import json
+import multiprocessing
+import zlib
+import hashlib
+import array
+import bisect
+import gzip
+import itertools
+import heapq
+import queue
+import random
+import uuid
+import hmac
+import ipaddress
+import secrets
+from collections import deque
+import sqlite3
+import csv
 import sys
 import urllib3
 import os
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-class ProxyChecker:
-    def __init__(self, output_file="proxies.json", max_threads=500):
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+
+METRIC_DEFINITIONS = {
+    "proxy_checks_total": ("counter", "Finished proxy checks by detected protocol and result"),
+    "proxy_prefilter_total": ("counter", "Proxies screened by the TCP connect prefilter by result"),
+    "proxy_checks_in_flight": ("gauge", "Proxy checks currently running"),
+    "proxy_check_duration_seconds": ("histogram", "Wall time of a full proxy check including retries"),
+    "proxy_source_fetch_total": ("counter", "Source fetches by outcome"),
+    "proxy_source_fetch_duration_seconds": ("gauge", "Duration of the last fetch of each source"),
+    "proxy_source_proxies": ("gauge", "Proxies parsed from the last fetch of each source"),
+    "proxy_store_flush_duration_seconds": ("histogram", "Time spent writing the proxy output files"),
+    "proxy_db_write_duration_seconds": ("histogram", "Time spent writing one batch of check history"),
+    "proxy_db_rows_written_total": ("counter", "Check history rows written to the database"),
+    "proxy_gateway_connections_total": ("counter", "Client connections handled by the gateway by outcome"),
+    "proxy_gateway_upstream_failures_total": ("counter", "Upstream attempts that failed, by whether the upstream was ejected"),
+    "proxy_gateway_connect_duration_seconds": ("histogram", "Time to open a tunnel through the chosen upstream"),
+}
+
+
+class Metrics:
+    def __init__(self, definitions, buckets=LATENCY_BUCKETS, retire_every=256):
+        self.definitions = definitions
+        self.buckets = buckets
+        self.retire_every = retire_every
+        self.lock = Lock()
+        self.local = threading.local()
+        self.shards = []
+        self.retired = ({}, {})
+        self.sent = ({}, {})
+        self.values = {}
+
+    def _shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = ({}, {})
+            with self.lock:
+                self.shards.append((threading.current_thread(), shard))
+                if len(self.shards) % self.retire_every == 0:
+                    self._retire_locked()
+            self.local.shard = shard
+            return shard
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard()[0]
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        histograms = self._shard()[1]
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect.bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def set(self, name, value, labels=()):
+        with self.lock:
+            self.values[(name, labels)] = value
+
+    def _merge(self, target, shard):
+        counters, histograms = target
+        for key, value in dict(shard[0]).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, histogram in dict(shard[1]).items():
+            merged = histograms.get(key)
+            histogram = list(histogram)
+            if merged is None:
+                histograms[key] = histogram
+            else:
+                histograms[key] = [a + b for a, b in zip(merged, histogram)]
+
+    def _retire_locked(self):
+        live = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self.retired, shard)
+        self.shards = live
+
+    def collect(self):
+        with self.lock:
+            self._retire_locked()
+            totals = ({}, {})
+            self._merge(totals, self.retired)
+            for thread, shard in self.shards:
+                self._merge(totals, shard)
+            values = dict(self.values)
+        return totals[0], totals[1], values
+
+    def drain(self):
+        counters, histograms, values = self.collect()
+        with self.lock:
+            sent_counters, sent_histograms = self.sent
+            self.sent = (counters, histograms)
+        counter_delta = {key: value - sent_counters.get(key, 0) for key, value in counters.items()
+                         if value != sent_counters.get(key, 0)}
+        histogram_delta = {}
+        for key, histogram in histograms.items():
+            sent = sent_histograms.get(key)
+            if sent is None:
+                histogram_delta[key] = histogram
+            elif histogram != sent:
+                histogram_delta[key] = [a - b for a, b in zip(histogram, sent)]
+        return counter_delta, histogram_delta
+
+    def absorb(self, delta):
+        with self.lock:
+            self._merge(self.retired, delta)
+
+    @staticmethod
+    def _format_labels(labels, extra=None):
+        pairs = list(labels) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = ('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                   for key, value in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self, gauges=()):
+        counters, histograms, values = self.collect()
+        series = {}
+        for (name, labels), value in itertools.chain(counters.items(), values.items()):
+            series.setdefault(name, []).append((labels, [f"{name}{self._format_labels(labels)} {value:g}"]))
+        for (name, labels), histogram in histograms.items():
+            lines = []
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), histogram):
+                cumulative += count
+                le = ('le', bound if bound == '+Inf' else f"{bound:g}")
+                lines.append(f"{name}_bucket{self._format_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {histogram[-1]:g}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {cumulative}")
+            series.setdefault(name, []).append((labels, lines))
+
+        output = []
+        for name, (kind, description) in self.definitions.items():
+            if name in series:
+                output.append(f"# HELP {name} {description}")
+                output.append(f"# TYPE {name} {kind}")
+                for labels, lines in sorted(series[name]):
+                    output.extend(lines)
+        for name, description, value in gauges:
+            output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} gauge")
+            output.append(f"{name} {value:g}")
+        return "\n".join(output) + "\n"
+
+
+METRICS = Metrics(METRIC_DEFINITIONS)
+
+
+class ValidProxyStore:
+    def __init__(self, output_file, text_file="Valid_Proxies.txt", invalid_file="Invalid_Proxies.txt",
+                 flush_size=500, flush_interval=5.0, latency_alpha=0.3):
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.output_file = output_file
+        self.text_file = text_file
+        self.invalid_file = invalid_file
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.latency_alpha = latency_alpha
+        self.geo = None
+        self.proxies = {}
+        self.by_type = {}
+        self.by_latency = []
+        self.by_type_latency = {}
+        self.version = 0
+        self.generation = 0
+        self.published = None
+        self._live_view = (None, None)
+        self._etag_seed = os.urandom(4).hex()
+        self._encoded_cache = {}
+        self._pending_valid = []
+        self._pending_invalid = []
+        self._rewrite_text = False
+        self._dirty = False
+        self.last_updated = time.time()
+        self.last_check = None
+        self.flush_count = 0
+        self._last_flush = time.monotonic()
+
+        if output_file is not None:
+            flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            flusher.start()
+
+    def reset(self, clear_invalid=False):
+        with self.flush_lock:
+            with self.lock:
+                self.published = None
+                self._clear_locked()
+                snapshot = self._snapshot_locked()
+
+            if self.output_file is None:
+                return
+            self._write_snapshot(snapshot)
+            with open(self.text_file, "w") as f:
+                f.write("")
+            if clear_invalid:
+                with open(self.invalid_file, "w") as f:
+                    f.write("")
+
+    def begin_generation(self, clear_invalid=False):
+        with self.flush_lock:
+            with self.lock:
+                if self.proxies:
+                    self.published = self._freeze_locked()
+                self._clear_locked()
+                self.generation += 1
+                published = self.published is not None
+                snapshot = self._snapshot_locked()
+
+            if self.output_file is None:
+                return published
+            if not published:
+                self._write_snapshot(snapshot)
+                with open(self.text_file, "w") as f:
+                    f.write("")
+            if clear_invalid:
+                with open(self.invalid_file, "w") as f:
+                    f.write("")
+        return published
+
+    def commit_generation(self):
+        with self.lock:
+            if not self.proxies and self.published is not None:
+                return False
+            self.published = None
+            self._live_view = (None, None)
+            self.version += 1
+            self._rewrite_text = True
+            self._dirty = True
+        self.flush()
+        return True
+
+    def _clear_locked(self):
+        self.proxies = {}
+        self.by_type = {}
+        self.by_latency = []
+        self.by_type_latency = {}
+        self._live_view = (None, None)
+        self.version += 1
+        self._pending_valid = []
+        self._pending_invalid = []
+        self._rewrite_text = False
+        self.last_updated = time.time()
+        self.last_check = None
+        self._dirty = False
+
+    def _freeze_locked(self):
+        return {
+            "proxies": self.proxies,
+            "by_type": self.by_type,
+            "by_latency": self.by_latency,
+            "by_type_latency": self.by_type_latency,
+            "last_updated": self.last_updated,
+            "last_check": self.last_check,
+            "generation": self.generation,
+            "revision": 0
+        }
+
+    def add(self, proxy_entry, timings=None):
+        location = self.geo.lookup(proxy_entry.split("://", 1)[-1].rpartition(':')[0]) if self.geo else (None, None)
+        with self.lock:
+            attributes = self.proxies.get(proxy_entry)
+            if attributes is not None:
+                if timings:
+                    self._unindex_latency_locked(proxy_entry, attributes)
+                    self._update_timings_locked(attributes, timings)
+                    self._index_latency_locked(proxy_entry, attributes)
+                    self.version += 1
+                return False
+
+            proxy_type = proxy_entry.split("://", 1)[0]
+            attributes = {"type": proxy_type, "latency": None, "connect": None, "ttfb": None, "total": None,
+                          "anonymity": None, "leaked": None, "exit_ip": None, "tunnel": None,
+                          "country": location[0], "asn": location[1]}
+            if timings:
+                self._update_timings_locked(attributes, timings)
+            self.proxies[proxy_entry] = attributes
+            self.by_type.setdefault(proxy_type, {})[proxy_entry] = None
+            self._index_latency_locked(proxy_entry, attributes)
+            self._pending_valid.append(proxy_entry)
+            self.version += 1
+            self.last_updated = time.time()
+            self._dirty = True
+            due = self._flush_due_locked()
+
+        if due:
+            self.flush()
+        return True
+
+    def remove(self, proxy_entry):
+        with self.lock:
+            published = self.published
+            if published is not None:
+                attributes = published["proxies"].pop(proxy_entry, None)
+                if attributes is not None:
+                    published["by_type"].get(attributes["type"], {}).pop(proxy_entry, None)
+                    self._unindex_latency_locked(proxy_entry, attributes, published)
+                    published["revision"] += 1
+                    self.version += 1
+
+            attributes = self.proxies.pop(proxy_entry, None)
+            if attributes is None:
+                return False
+            self.by_type.get(attributes["type"], {}).pop(proxy_entry, None)
+            self._unindex_latency_locked(proxy_entry, attributes)
+            self.version += 1
+            self._rewrite_text = True
+            self.last_updated = time.time()
+            self._dirty = True
+        return True
+
+    def _update_timings_locked(self, attributes, timings):
+        for key in TIMING_KEYS:
+            if timings.get(key) is not None:
+                attributes[key] = timings[key]
+        for key in PROFILE_KEYS:
+            if key in timings:
+                attributes[key] = timings[key]
+        if timings.get("total") is not None:
+            if attributes["latency"] is None:
+                attributes["latency"] = timings["total"]
+            else:
+                attributes["latency"] += self.latency_alpha * (timings["total"] - attributes["latency"])
+
+    def _index_latency_locked(self, proxy_entry, attributes):
+        if attributes["latency"] is None:
+            return
+        key = (attributes["latency"], proxy_entry)
+        bisect.insort(self.by_latency, key)
+        bisect.insort(self.by_type_latency.setdefault(attributes["type"], []), key)
+
+    def _unindex_latency_locked(self, proxy_entry, attributes, view=None):
+        if attributes["latency"] is None:
+            return
+        view = view or self._building_view_locked()
+        key = (attributes["latency"], proxy_entry)
+        for index in (view["by_latency"], view["by_type_latency"].get(attributes["type"], [])):
+            position = bisect.bisect_left(index, key)
+            if position < len(index) and index[position] == key:
+                del index[position]
+
+    def query(self, proxy_type=None, max_latency=None, offset=0, limit=None, sort=None, view=None, filters=None):
+        with self.lock:
+            return self._query_locked(proxy_type, max_latency, offset, limit, sort, self._view_locked(view), filters)
+
+    def _building_view_locked(self):
+        return {
+            "proxies": self.proxies,
+            "by_type": self.by_type,
+            "by_latency": self.by_latency,
+            "by_type_latency": self.by_type_latency,
+            "last_updated": self.last_updated,
+            "last_check": self.last_check,
+            "generation": self.generation
+        }
+
+    def _view_version_locked(self, view=None):
+        if self.published is None or view == 'live':
+            return self.version
+        return f"g{self.published['generation']}.{self.published['revision']}"
+
+    def _view_locked(self, view=None):
+        published = self.published
+        if published is None:
+            return self._building_view_locked()
+        if view != 'live':
+            return published
+
+        version, merged = self._live_view
+        if version == self.version:
+            return merged
+
+        proxies = dict(published["proxies"])
+        proxies.update(self.proxies)
+        by_type = {}
+        for source in (published["by_type"], self.by_type):
+            for proxy_type, entries in source.items():
+                by_type.setdefault(proxy_type, {}).update(entries)
+
+        def merge_latency(previous, current):
+            return list(heapq.merge((key for key in previous if key[1] not in self.proxies), current))
+
+        merged = {
+            "proxies": proxies,
+            "by_type": by_type,
+            "by_latency": merge_latency(published["by_latency"], self.by_latency),
+            "by_type_latency": {
+                proxy_type: merge_latency(published["by_type_latency"].get(proxy_type, []),
+                                          self.by_type_latency.get(proxy_type, []))
+                for proxy_type in set(published["by_type_latency"]) | set(self.by_type_latency)
+            },
+            "last_updated": self.last_updated,
+            "last_check": self.last_check,
+            "generation": self.generation
+        }
+        self._live_view = (self.version, merged)
+        return merged
+
+    def _query_locked(self, proxy_type, max_latency, offset, limit, sort=None, view=None, filters=None):
+        view = view or self._building_view_locked()
+        if max_latency is not None or sort == 'latency':
+            index = view["by_latency"] if proxy_type is None else view["by_type_latency"].get(proxy_type, [])
+            if max_latency is None:
+                end = len(index)
+            else:
+                end = bisect.bisect_right(index, (max_latency, '\uffff'))
+            if filters:
+                return self._filter_locked((entry for latency, entry in index[:end]), offset, limit, view, filters)
+            stop = end if limit is None else min(end, offset + limit)
+            return [entry for latency, entry in index[offset:stop]], end
+
+        entries = view["proxies"] if proxy_type is None else view["by_type"].get(proxy_type, {})
+        if filters:
+            return self._filter_locked(entries, offset, limit, view, filters)
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(entries, offset, stop)), len(entries)
+
+    def _filter_locked(self, entries, offset, limit, view, filters):
+        proxies = view["proxies"]
+        matches = [entry for entry in entries
+                   if all(proxies[entry].get(key) in values for key, values in filters)]
+        stop = None if limit is None else offset + limit
+        return matches[offset:stop], len(matches)
+
+    def encoded(self, proxy_type=None, max_latency=None, offset=0, limit=None, compress=False, sort=None, view=None,
+                filters=None, details=False):
+        key = (proxy_type, max_latency, offset, limit, sort, filters, details, view)
+        with self.lock:
+            version = self._view_version_locked(view)
+            cached = self._encoded_cache.get(key)
+            if cached is not None and cached["version"] != version:
+                cached = None
+
+            if cached is None:
+                source = self._view_locked(view)
+                if key[:7] == (None, None, 0, None, None, None, False):
+                    data = self._snapshot_locked(source)
+                else:
+                    proxies, total = self._query_locked(proxy_type, max_latency, offset, limit, sort, source, filters)
+                    if details:
+                        proxies = [dict(source["proxies"][entry], proxy=entry) for entry in proxies]
+                    data = {
+                        "proxies": proxies,
+                        "count": len(proxies),
+                        "total": total,
+                        "last_updated": source["last_updated"],
+                        "last_check": source["last_check"],
+                        "generation": source["generation"]
+                    }
+
+        if cached is None:
+            body = json.dumps(data, separators=(',', ':')).encode()
+            etag = f'"{self._etag_seed}-{version}-{hashlib.sha1(repr(key).encode()).hexdigest()[:8]}"'
+            cached = {"body": body, "etag": etag, "gzip": None, "version": version}
+            with self.lock:
+                if self._view_version_locked(view) == version:
+                    if len(self._encoded_cache) >= 256:
+                        self._encoded_cache = {}
+                    self._encoded_cache[key] = cached
+
+        if compress and cached["gzip"] is None:
+            cached["gzip"] = gzip.compress(cached["body"], 6)
+        if compress:
+            return cached["etag"][:-1] + '-gzip"', cached["gzip"]
+        return cached["etag"], cached["body"]
+
+    def count(self):
+        with self.lock:
+            return len(self.proxies)
+
+    def latencies(self, view=None, known_version=None):
+        with self.lock:
+            version = self._view_version_locked(view)
+            if version == known_version:
+                return version, None
+            source = self._view_locked(view)
+            return version, [(entry, attributes["latency"]) for entry, attributes in source["proxies"].items()]
+
+    def add_invalid(self, proxy):
+        with self.lock:
+            self._pending_invalid.append(proxy)
+            self._dirty = True
+            due = self._flush_due_locked()
+
+        if due:
+            self.flush()
+
+    def set_last_check(self, timestamp):
+        with self.lock:
+            self.last_check = timestamp
+            self.version += 1
+            self._dirty = True
+
+    def snapshot(self, view=None):
+        with self.lock:
+            return self._snapshot_locked(self._view_locked(view))
+
+    def _snapshot_locked(self, view=None):
+        view = view or self._building_view_locked()
+        return {
+            "proxies": list(view["proxies"]),
+            "count": len(view["proxies"]),
+            "last_updated": view["last_updated"],
+            "last_check": view["last_check"],
+            "generation": view["generation"]
+        }
+
+    def generation_stats(self):
+        with self.lock:
+            published = self.published
+            return {
+                "generation": self.generation,
+                "building": published is not None,
+                "served": len(published["proxies"]) if published is not None else len(self.proxies),
+                "served_generation": published["generation"] if published is not None else self.generation,
+                "pending": len(self.proxies)
+            }
+
+    def _flush_due_locked(self):
+        pending = len(self._pending_valid) + len(self._pending_invalid)
+        if pending >= self.flush_size:
+            return True
+        return pending > 0 and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self._dirty:
+                    return
+                snapshot = self._snapshot_locked() if self.published is None else None
+                pending_valid, self._pending_valid = self._pending_valid, []
+                pending_invalid, self._pending_invalid = self._pending_invalid, []
+                rewrite_text, self._rewrite_text = self._rewrite_text, False
+                self._dirty = False
+                self._last_flush = time.monotonic()
+            if self.output_file is None:
+                return
+
+            start = time.perf_counter()
+            try:
+                if snapshot is not None:
+                    self._write_snapshot(snapshot)
+                    if rewrite_text:
+                        temp_file = f"{self.text_file}.tmp"
+                        with open(temp_file, "w") as f:
+                            f.write("".join(f"{entry}\n" for entry in snapshot["proxies"]))
+                        os.replace(temp_file, self.text_file)
+                    elif pending_valid:
+                        with open(self.text_file, "a") as f:
+                            f.write("".join(f"{entry}\n" for entry in pending_valid))
+                if pending_invalid:
+                    with open(self.invalid_file, "a") as f:
+                        f.write("".join(f"{entry}\n" for entry in pending_invalid))
+                self.flush_count += 1
+            except Exception as e:
+                print(f"\n[Error] Failed to write proxies: {e}")
+            METRICS.observe("proxy_store_flush_duration_seconds", time.perf_counter() - start)
+
+    def _write_snapshot(self, snapshot):
+        temp_file = f"{self.output_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(temp_file, self.output_file)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self.lock:
+                due = self._dirty and time.monotonic() - self._last_flush >= self.flush_interval
+            if due:
+                self.flush()
+
+
+class SourceCache:
+    def __init__(self, path="source_cache.json"):
+        self.lock = Lock()
+        self.path = path
+        self.entries = {}
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, url):
+        with self.lock:
+            return self.entries.get(url)
+
+    def put(self, url, entry):
+        with self.lock:
+            self.entries[url] = entry
+
+    def save(self):
+        with self.lock:
+            data = dict(self.entries)
+        try:
+            temp_file = f"{self.path}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(temp_file, self.path)
+        except Exception as e:
+            print(f"\n[Error] Failed to write source cache: {e}")
+
+
+class SourceStats:
+    def __init__(self, path="source_stats.json", fetch_alpha=0.3, grace_cycles=2, max_skip=16):
+        self.lock = Lock()
+        self.path = path
+        self.fetch_alpha = fetch_alpha
+        self.grace_cycles = grace_cycles
+        self.max_skip = max_skip
+        self.cycle = 0
+        self.sources = {}
+        self.proxy_sources = {}
+        self.tally = None
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+                self.cycle = data.get("cycle", 0)
+                self.sources = data.get("sources", {})
+        except (OSError, ValueError):
+            pass
+
+    def _source_locked(self, url):
+        source = self.sources.get(url)
+        if source is None:
+            source = self.sources[url] = {
+                "status": "new",
+                "fetches": 0,
+                "last_fetch_seconds": None,
+                "avg_fetch_seconds": None,
+                "last_fetch_status": None,
+                "found": 0,
+                "unique": 0,
+                "valid": 0,
+                "valid_unique": 0,
+                "total_valid": 0,
+                "unproductive_cycles": 0,
+                "skip_until": 0
+            }
+        return source
+
+    def start_cycle(self, urls, prune=True):
+        with self.lock:
+            self._finish_cycle_locked()
+            self.cycle += 1
+            self.tally = {}
+            self.proxy_sources = {}
+            return [url for url in urls
+                    if not prune or self._source_locked(url)["skip_until"] <= self.cycle]
+
+    def record_fetch(self, url, seconds, status):
+        with self.lock:
+            source = self._source_locked(url)
+            source["fetches"] += 1
+            source["last_fetch_seconds"] = round(seconds, 4)
+            source["last_fetch_status"] = status
+            previous = source["avg_fetch_seconds"]
+            source["avg_fetch_seconds"] = round(
+                seconds if previous is None else previous + self.fetch_alpha * (seconds - previous), 4)
+
+    def attribute(self, results):
+        with self.lock:
+            if self.tally is None:
+                return
+            for url, found in results:
+                tally = self.tally[url] = {"found": len(found), "unique": 0, "valid": 0, "valid_unique": 0}
+                for proxy in found:
+                    listed = self.proxy_sources.get(proxy)
+                    if listed is None:
+                        self.proxy_sources[proxy] = (url,)
+                        tally["unique"] += 1
+                    elif url not in listed:
+                        self.proxy_sources[proxy] = listed + (url,)
+
+    def credit(self, proxy, valid_type):
+        with self.lock:
+            listed = self.proxy_sources.pop(proxy, None)
+            if not listed or not valid_type or self.tally is None:
+                return
+            for url in listed:
+                self.tally[url]["valid"] += 1
+            self.tally[listed[0]]["valid_unique"] += 1
+
+    def finish_cycle(self):
+        with self.lock:
+            self._finish_cycle_locked()
+        self.save()
+
+    def _finish_cycle_locked(self):
+        if self.tally is None:
+            return
+        for url, tally in self.tally.items():
+            source = self._source_locked(url)
+            source.update(tally)
+            source["total_valid"] += tally["valid"]
+            if tally["valid_unique"]:
+                source["status"] = "active"
+                source["unproductive_cycles"] = 0
+                source["skip_until"] = 0
+                continue
+
+            source["unproductive_cycles"] += 1
+            source["status"] = "duplicate" if tally["valid"] else "zero-yield"
+            over = source["unproductive_cycles"] - self.grace_cycles
+            if over > 0:
+                max_skip = self.max_skip if source["status"] == "zero-yield" else max(1, self.max_skip // 4)
+                source["skip_until"] = self.cycle + min(2 ** over, max_skip)
+        self.tally = None
+        self.proxy_sources = {}
+
+    def report(self):
+        with self.lock:
+            sources = [dict(source, url=url, skipped=source["skip_until"] > self.cycle)
+                       for url, source in self.sources.items()]
+            cycle = self.cycle
+        sources.sort(key=lambda source: (-source["total_valid"], source["url"]))
+        return {"cycle": cycle, "sources": sources}
+
+    def save(self):
+        with self.lock:
+            data = {"cycle": self.cycle, "sources": dict(self.sources)}
+        try:
+            temp_file = f"{self.path}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(temp_file, self.path)
+        except Exception as e:
+            print(f"\n[Error] Failed to write source stats: {e}")
+
+
+class ProxyHealthDB:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS proxies (
+            proxy TEXT PRIMARY KEY,
+            protocol TEXT,
+            source TEXT,
+            first_seen REAL NOT NULL,
+            last_checked REAL NOT NULL,
+            last_success REAL,
+            last_latency REAL,
+            smoothed_latency REAL,
+            valid INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS checks (
+            proxy TEXT NOT NULL,
+            protocol TEXT,
+            success INTEGER NOT NULL,
+            latency REAL,
+            connect_time REAL,
+            ttfb REAL,
+            checked_at REAL NOT NULL,
+            source TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_proxies_valid_protocol ON proxies(valid, protocol);
+        CREATE INDEX IF NOT EXISTS idx_proxies_valid_latency ON proxies(valid, smoothed_latency);
+        CREATE INDEX IF NOT EXISTS idx_checks_time_proxy ON checks(checked_at, proxy, success);
+        CREATE INDEX IF NOT EXISTS idx_checks_proxy_time ON checks(proxy, checked_at);
+    """
+
+    def __init__(self, path, batch_size=1000, flush_interval=1.0, latency_alpha=0.3):
+        self.path = path
+        self.latency_alpha = latency_alpha
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        self._migrate(connection)
+        connection.executescript(self.SCHEMA)
+        connection.commit()
+
+        self._writer = threading.Thread(target=self._writer_loop, args=(connection,), daemon=True)
+        self._writer.start()
+
+    def _migrate(self, connection):
+        for table, column in (("proxies", "smoothed_latency"), ("checks", "connect_time"), ("checks", "ttfb")):
+            columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+            if columns and column not in columns:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} REAL")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, proxy, protocol, timings, source=None, checked_at=None):
+        timings = timings or {}
+        self.queue.put((proxy, protocol, 1 if protocol else 0, timings.get("total"),
+                        timings.get("connect"), timings.get("ttfb"), checked_at or time.time(), source))
+
+    def flush(self):
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+
+    def _writer_loop(self, connection):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not isinstance(batch[-1], threading.Event):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            rows = [item for item in batch if not isinstance(item, threading.Event)]
+            if rows:
+                start = time.perf_counter()
+                try:
+                    self._write_rows(connection, rows)
+                    METRICS.inc("proxy_db_rows_written_total", value=len(rows))
+                except sqlite3.Error as e:
+                    print(f"\n[Error] Failed to write check history: {e}")
+                METRICS.observe("proxy_db_write_duration_seconds", time.perf_counter() - start)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write_rows(self, connection, rows):
+        with connection:
+            connection.executemany(
+                "INSERT INTO checks (proxy, protocol, success, latency, connect_time, ttfb, checked_at, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.executemany(
+                """INSERT INTO proxies (proxy, protocol, source, first_seen, last_checked,
+                                      last_success, last_latency, smoothed_latency, valid)
+                   VALUES (?1, ?2, ?8, ?7, ?7, CASE WHEN ?3 THEN ?7 END, ?4, ?4, ?3)
+                   ON CONFLICT(proxy) DO UPDATE SET
+                       protocol = COALESCE(excluded.protocol, proxies.protocol),
+                       source = COALESCE(proxies.source, excluded.source),
+                       last_checked = excluded.last_checked,
+                       last_success = COALESCE(excluded.last_success, proxies.last_success),
+                       last_latency = COALESCE(excluded.last_latency, proxies.last_latency),
+                       smoothed_latency = CASE
+                           WHEN excluded.last_latency IS NULL THEN proxies.smoothed_latency
+                           WHEN proxies.smoothed_latency IS NULL THEN excluded.last_latency
+                           ELSE proxies.smoothed_latency + ?9 * (excluded.last_latency - proxies.smoothed_latency)
+                       END,
+                       valid = excluded.valid""",
+                [row[:8] + (self.latency_alpha,) for row in rows])
+
+    def _query(self, sql, params=()):
+        connection = self._connect()
+        try:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute(sql, params)]
+        finally:
+            connection.close()
+
+    def valid_now(self, protocol=None, limit=100):
+        if protocol:
+            return self._query("SELECT * FROM proxies WHERE valid = 1 AND protocol = ? LIMIT ?",
+                               (protocol, limit))
+        return self._query("SELECT * FROM proxies WHERE valid = 1 LIMIT ?", (limit,))
+
+    def fastest(self, limit=100, protocol=None):
+        if protocol:
+            return self._query("SELECT * FROM proxies WHERE valid = 1 AND protocol = ? "
+                               "AND smoothed_latency IS NOT NULL ORDER BY smoothed_latency LIMIT ?",
+                               (protocol, limit))
+        return self._query("SELECT * FROM proxies WHERE valid = 1 AND smoothed_latency IS NOT NULL "
+                           "ORDER BY smoothed_latency LIMIT ?", (limit,))
+
+    def uptime(self, hours=24, limit=100):
+        return self._query(
+            """SELECT proxy, COUNT(*) AS checks, SUM(success) AS successes,
+                      ROUND(1.0 * SUM(success) / COUNT(*), 4) AS uptime
+               FROM checks WHERE checked_at >= ?
+               GROUP BY proxy ORDER BY uptime DESC, checks DESC LIMIT ?""",
+            (time.time() - hours * 3600, limit))
+
+
+class CheckResultCache:
+    def __init__(self, ttl=60, max_entries=10000):
+        self.lock = Lock()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.results = {}
+        self.in_flight = {}
+
+    def get_or_check(self, key, check, fresh=False):
+        while True:
+            with self.lock:
+                cached = self.results.get(key)
+                if cached and not fresh and time.time() - cached[1] < self.ttl:
+                    return cached[0], cached[1], True
+
+                event = self.in_flight.get(key)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    self.in_flight[key] = event
+
+            if not owner:
+                event.wait()
+                fresh = False
+                continue
+
+            try:
+                result = check()
+                checked_at = time.time()
+                with self.lock:
+                    self.results.pop(key, None)
+                    self.results[key] = (result, checked_at)
+                    self._evict_locked(checked_at)
+                return result, checked_at, False
+            finally:
+                with self.lock:
+                    self.in_flight.pop(key, None)
+                event.set()
+
+    def _evict_locked(self, now):
+        while len(self.results) > self.max_entries:
+            oldest = next(iter(self.results))
+            del self.results[oldest]
+        for key in [key for key, (result, checked_at) in itertools.islice(self.results.items(), 64)
+                    if now - checked_at >= self.ttl]:
+            del self.results[key]
+
+
+class LeaseQueue:
+    def __init__(self, proxies, proxy_types, judge_url, chunk_size=500, lease_timeout=120, hints=None):
+        self.lock = Lock()
+        self.source = iter(proxies)
+        self.hints = hints if hints is not None else {}
+        self.proxy_types = proxy_types
+        self.judge_url = judge_url
+        self.chunk_size = chunk_size
+        self.lease_timeout = lease_timeout
+        self.requeued = deque()
+        self.pending = {}
+        self.leases = {}
+        self.exhausted = False
+        self.expired_count = 0
+        self.done = threading.Event()
+
+    def _next_chunk_locked(self, size):
+        while self.requeued:
+            chunk = [proxy for proxy in self.requeued.popleft() if proxy in self.pending]
+            if chunk:
+                return chunk
+        if self.exhausted:
+            return []
+        chunk = list(itertools.islice(self.source, size))
+        if len(chunk) < size:
+            self.exhausted = True
+        self.pending.update(dict.fromkeys(chunk))
+        return chunk
+
+    def _requeue_locked(self, lease):
+        remaining = [proxy for proxy in lease["remaining"] if proxy in self.pending]
+        if remaining:
+            self.requeued.append(remaining)
+
+    def _reap_locked(self, now):
+        for lease_id, lease in list(self.leases.items()):
+            if lease["expires"] <= now:
+                del self.leases[lease_id]
+                self._requeue_locked(lease)
+                self.expired_count += 1
+
+    def _check_done_locked(self):
+        if self.exhausted and not self.pending:
+            self.done.set()
+
+    def lease(self, worker, size=None):
+        now = time.time()
+        with self.lock:
+            self._reap_locked(now)
+            chunk = self._next_chunk_locked(min(size or self.chunk_size, self.chunk_size))
+            if not chunk:
+                self._check_done_locked()
+                return None
+            lease_id = uuid.uuid4().hex
+            self.leases[lease_id] = {
+                "worker": worker,
+                "remaining": set(chunk),
+                "expires": now + self.lease_timeout
+            }
+        return {
+            "lease_id": lease_id,
+            "proxies": chunk,
+            "hints": {proxy: self.hints[proxy] for proxy in chunk if proxy in self.hints},
+            "proxy_types": self.proxy_types,
+            "judge_url": self.judge_url,
+            "lease_timeout": self.lease_timeout
+        }
+
+    def complete(self, lease_id, results, final=False):
+        accepted = []
+        with self.lock:
+            for result in results:
+                if result[0] in self.pending:
+                    del self.pending[result[0]]
+                    accepted.append(result)
+
+            lease = self.leases.get(lease_id)
+            if lease is not None:
+                lease["remaining"].difference_update(result[0] for result in results)
+                lease["expires"] = time.time() + self.lease_timeout
+                if final or not lease["remaining"]:
+                    del self.leases[lease_id]
+                    self._requeue_locked(lease)
+            self._check_done_locked()
+        return accepted, lease is None
+
+    def wait(self, poll_interval=5):
+        while not self.done.wait(poll_interval):
+            with self.lock:
+                self._reap_locked(time.time())
+                self._check_done_locked()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "active_leases": len(self.leases),
+                "requeued_chunks": len(self.requeued),
+                "pending_proxies": len(self.pending),
+                "expired_leases": self.expired_count,
+                "source_exhausted": self.exhausted
+            }
+
+
+class RecheckScheduler:
+    def __init__(self, min_interval=300, max_interval=21600, dead_interval=600,
+                 max_dead_interval=86400, drop_after=10, jitter=0.1):
+        self.condition = threading.Condition()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.dead_interval = dead_interval
+        self.max_dead_interval = max_dead_interval
+        self.drop_after = drop_after
+        self.jitter = jitter
+        self.heap = []
+        self.states = {}
+
+    def __len__(self):
+        with self.condition:
+            return len(self.states)
+
+    def add(self, proxies, spread=None, chunk_size=1000):
+        if spread is None:
+            spread = self.min_interval * self.jitter
+        added = 0
+        source = iter(proxies)
+        while True:
+            chunk = list(itertools.islice(source, chunk_size))
+            if not chunk:
+                return added
+            now = time.time()
+            with self.condition:
+                for proxy in chunk:
+                    if proxy in self.states:
+                        continue
+                    due = now + random.uniform(0, spread)
+                    self.states[proxy] = {
+                        "due": due,
+                        "interval": self.min_interval,
+                        "valid_type": None,
+                        "checked": False,
+                        "failures": 0,
+                        "flaps": 0
+                    }
+                    heapq.heappush(self.heap, (due, proxy))
+                    added += 1
+                self.condition.notify_all()
+
+    def _pop_due_locked(self, now):
+        while self.heap:
+            due, proxy = self.heap[0]
+            state = self.states.get(proxy)
+            if state is None or state["due"] != due:
+                heapq.heappop(self.heap)
+                continue
+            if due > now:
+                return None
+            heapq.heappop(self.heap)
+            state["due"] = None
+            return proxy
+        return None
+
+    def pop_due(self):
+        with self.condition:
+            return self._pop_due_locked(time.time())
+
+    def seconds_until_next(self, default=1.0):
+        with self.condition:
+            while self.heap:
+                due, proxy = self.heap[0]
+                state = self.states.get(proxy)
+                if state is None or state["due"] != due:
+                    heapq.heappop(self.heap)
+                    continue
+                return max(0.0, due - time.time())
+            return default
+
+    def next_due(self):
+        with self.condition:
+            while True:
+                now = time.time()
+                proxy = self._pop_due_locked(now)
+                if proxy is not None:
+                    return proxy
+                wait = self.heap[0][0] - now if self.heap else None
+                self.condition.wait(wait)
+
+    def expedite(self, proxy):
+        with self.condition:
+            state = self.states.get(proxy)
+            if state is None or state["due"] is None:
+                return False
+            state["due"] = time.time()
+            heapq.heappush(self.heap, (state["due"], proxy))
+            self.condition.notify()
+            return True
+
+    def report(self, proxy, valid_type):
+        with self.condition:
+            state = self.states.get(proxy)
+            if state is None:
+                return None, False
+
+            previous_type = state["valid_type"]
+            first_check = not state["checked"]
+            changed = not first_check and previous_type != valid_type
+            state["checked"] = True
+            state["valid_type"] = valid_type
+
+            if changed:
+                state["flaps"] += 1
+                interval = self.min_interval
+            elif valid_type:
+                state["flaps"] = max(0, state["flaps"] - 1)
+                interval = self.min_interval if state["flaps"] else min(state["interval"] * 2, self.max_interval)
+            else:
+                interval = None
+
+            if valid_type:
+                state["failures"] = 0
+            else:
+                state["failures"] += 1
+                if self.drop_after and state["failures"] >= self.drop_after:
+                    del self.states[proxy]
+                    return previous_type, first_check
+                if interval is None:
+                    interval = min(self.dead_interval * 2 ** (state["failures"] - 1), self.max_dead_interval)
+
+            state["interval"] = interval
+            due = time.time() + interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            state["due"] = due
+            heapq.heappush(self.heap, (due, proxy))
+            self.condition.notify()
+            return previous_type, first_check
+
+
+class AdaptiveController:
+    FD_ERRNOS = (errno.EMFILE, errno.ENFILE, errno.ENOBUFS)
+
+    def __init__(self, max_limit, min_limit=8, initial_limit=64, increase=8, decrease=0.7, window=200,
+                 default_timeout=2.0, min_timeout=1.0, max_timeout=6.0, timeout_multiplier=3.0,
+                 percentile=0.95, min_samples=20, history=256, fd_headroom=0.8):
+        self.lock = Lock()
+        self.condition = threading.Condition(self.lock)
+        self.max_limit = max(min_limit, self._fd_ceiling(max_limit))
+        self.min_limit = min_limit
+        self.limit = max(min_limit, min(initial_limit, self.max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.history = history
+        self.fd_headroom = fd_headroom
+        self.in_flight = 0
+        self.async_waiters = deque()
+        self.samples = {}
+        self.timeouts = {}
+        self.outcomes = {"ok": 0, "timeout": 0, "error": 0, "overload": 0}
+        self.baseline_timeout_rate = None
+        self.baseline_latency = None
+        self.slow_start = True
+        self.window_latencies = []
+
+    @staticmethod
+    def _fd_limit():
+        if resource is None:
+            return None
+        try:
+            return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        except (ValueError, OSError):
+            return None
+
+    def _fd_ceiling(self, max_limit):
+        _raise_fd_limit()
+        soft = self._fd_limit()
+        if soft is None or soft == resource.RLIM_INFINITY:
+            return max_limit
+        return min(max_limit, max(1, (soft - 64) // 2))
+
+    def _fds_in_use(self):
+        try:
+            return len(os.listdir('/proc/self/fd'))
+        except OSError:
+            return None
+
+    def try_acquire(self):
+        with self.lock:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        if self.try_acquire():
+            return
+        future = asyncio.get_running_loop().create_future()
+        with self.lock:
+            self.async_waiters.append(future)
+            self._wake_locked()
+        await future
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self._wake_locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def _wake_locked(self):
+        while self.async_waiters and self.in_flight < self.limit:
+            future = self.async_waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.get_loop().call_soon_threadsafe(self._resolve_waiter, future)
+        if self.in_flight < self.limit:
+            self.condition.notify(self.limit - self.in_flight)
+
+    def _resolve_waiter(self, future):
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def timeout_for(self, key):
+        return self.timeouts.get(key, self.default_timeout)
+
+    def retry_delay(self, key):
+        return min(0.5, max(0.01, self.timeout_for(key) / (self.timeout_multiplier * 10))) * random.uniform(0.5, 1.5)
+
+    def observe(self, key, latency, window=False):
+        if latency is None:
+            return
+        with self.lock:
+            if window:
+                self.window_latencies.append(latency)
+            samples = self.samples.get(key)
+            if samples is None:
+                samples = self.samples[key] = deque(maxlen=self.history)
+            samples.append(latency)
+            if len(samples) >= self.min_samples and len(samples) % 16 == 0:
+                ordered = sorted(samples)
+                value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+                self.timeouts[key] = min(self.max_timeout, max(self.min_timeout, value * self.timeout_multiplier))
+
+    def record(self, outcome, error=None):
+        if error is not None and getattr(error, 'errno', None) in self.FD_ERRNOS or (
+                error is not None and 'Too many open files' in str(error)):
+            outcome = "overload"
+        with self.lock:
+            self.outcomes[outcome] += 1
+            if sum(self.outcomes.values()) >= self.window:
+                self._adjust_locked()
+
+    def _adjust_locked(self):
+        total = sum(self.outcomes.values())
+        timeout_rate = self.outcomes["timeout"] / total
+        overloaded = self.outcomes["overload"] > 0
+
+        fds = self._fds_in_use()
+        soft = self._fd_limit()
+        if fds is not None and soft and soft != resource.RLIM_INFINITY and fds > soft * self.fd_headroom:
+            overloaded = True
+
+        latency = None
+        if len(self.window_latencies) >= self.min_samples // 2:
+            latency = sorted(self.window_latencies)[len(self.window_latencies) // 2]
+        self.window_latencies = []
+
+        if latency is not None and self.baseline_latency is not None:
+            timeouts_rising = (self.baseline_timeout_rate is not None
+                               and timeout_rate > self.baseline_timeout_rate + 0.1)
+            if latency > self.baseline_latency * 2 + 0.1 or (
+                    timeouts_rising and latency > self.baseline_latency * 1.5 + 0.05):
+                overloaded = True
+
+        if overloaded:
+            self.limit = max(self.min_limit, int(self.limit * self.decrease))
+            self.slow_start = False
+        else:
+            self.limit = min(self.max_limit, self.limit * 2 if self.slow_start else self.limit + self.increase)
+            self._wake_locked()
+
+        if self.baseline_timeout_rate is None:
+            self.baseline_timeout_rate = timeout_rate
+        else:
+            self.baseline_timeout_rate += 0.1 * (timeout_rate - self.baseline_timeout_rate)
+        if latency is not None:
+            self.baseline_latency = latency if self.baseline_latency is None else min(
+                latency, self.baseline_latency * 1.01)
+        for key in self.outcomes:
+            self.outcomes[key] = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "limit": self.limit,
+                "max_limit": self.max_limit,
+                "in_flight": self.in_flight,
+                "timeouts": {key: round(value, 3) for key, value in self.timeouts.items()}
+            }
+
+
+class ProxyChecker:
+    def __init__(self, output_file="proxies.json", max_threads=500, engine="thread", workers=1, role="standalone",
+                 flush_size=500, flush_interval=5.0, scrape_workers=16, source_cache_file=None,
+                 sniff=True, db_file=None, check_cache_ttl=60, source_stats_file=None, source_pruning=True,
+                 prefilter=False, prefilter_timeout=1.0, prefilter_concurrency=1024, adaptive=False,
+                 race=False, race_stagger=0.25, geo_db=None, countries=None, asns=None):
+        self.lock = Lock()
+        self.file_lock = Lock()
+        self.checked_count = 0
+        self.valid_count = 0
+        self.scraped_count = 0
+        self.output_file = output_file
+        self.max_threads = max_threads
+        self.engine = engine
+        self.workers = workers
+        self.role = role
+        self.lease_queue = None
+        self.scheduler = None
+        self.gateway = None
+        self.lease_size = 500
+        self.lease_timeout = 120
+        self.lease_token = None
+        self.judge_url = "http://httpbin.org/get"
+        self.real_ip = None
+        self.judge_lock = Lock()
+        self.sniff = sniff
+        self.prefilter = prefilter
+        self.prefilter_timeout = prefilter_timeout
+        self.prefilter_concurrency = prefilter_concurrency
+        self.adaptive = adaptive
+        self.race = race
+        self.race_stagger = race_stagger
+        self.controller = AdaptiveController(max_threads) if adaptive else None
+        self.db = ProxyHealthDB(db_file) if db_file else None
+        self.current_source = None
+        self.protocol_hints = {}
+        self.check_cache = CheckResultCache(ttl=check_cache_ttl)
+        self._judge_address = None
+        self._pending_queue = None
+        self.last_run = None
+        self.scrape_workers = scrape_workers
+        self.source_cache = SourceCache(source_cache_file) if source_cache_file else None
+        self.source_stats = SourceStats(source_stats_file) if source_stats_file else None
+        self.source_pruning = source_pruning
+        self.store = ValidProxyStore(output_file, flush_size=flush_size, flush_interval=flush_interval)
+        self.geo = IPRangeIndex.load(geo_db) if geo_db else None
+        self.countries = {country.upper() for country in countries} if countries else None
+        self.asns = set(asns) if asns else None
+        self.store.geo = self.geo
+        self._initialize_output_file()
+
+    def _initialize_output_file(self, clear_invalid=False):
+        self.store.reset(clear_invalid=clear_invalid)
+
+    def _add_proxy_to_file(self, proxy_string, timings=None):
+        self.store.add(proxy_string, timings)
+
+    def _read_proxies_from_file(self):
+        try:
+            with open(self.output_file, 'r') as f:
+                data = json.load(f)
+                return data.get("proxies", []), data.get("count", 0)
+        except:
+            return [], 0
+
+    def reset_counters(self):
+        with self.lock:
+            self.checked_count = 0
+            self.valid_count = 0
+            self.scraped_count = 0
+            self.last_run = datetime.now()
+
+    def _candidate_types(self, proxy_types, reachable, detected):
+        if not reachable:
+            return []
+        if detected in proxy_types:
+            return [detected]
+        return proxy_types
+
+    def _resolve_judge_address(self):
+        if self._judge_address is None:
+            judge_host, judge_port, judge_path, host_header = self._judge_target()
+            self._judge_address = (socket.gethostbyname(judge_host), judge_port)
+        return self._judge_address
+
+    def _timeout_for(self, key, timeout=None):
+        if timeout:
+            return timeout
+        return self.controller.timeout_for(key) if self.controller else 2
+
+    def _retry_delay(self, key):
+        return self.controller.retry_delay(key) if self.controller else 0.05
+
+    def _record_outcome(self, outcome, key=None, latency=None, error=None):
+        if self.controller:
+            if latency is not None:
+                self.controller.observe(key, latency, window=key != "connect")
+            self.controller.record(outcome, error)
+
+    def _check_proxy_types(self, proxy, proxy_types, retries=2, timeout=None):
+        METRICS.inc("proxy_checks_in_flight")
+        start = time.perf_counter()
+        valid_type = None
+        try:
+            valid_type, timings = self._probe_proxy_types(proxy, proxy_types, retries, timeout)
+            return valid_type, timings
+        finally:
+            METRICS.inc("proxy_checks_in_flight", value=-1)
+            self._observe_check(valid_type, time.perf_counter() - start)
+
+    def _observe_check(self, valid_type, elapsed):
+        result = "valid" if valid_type else "invalid"
+        METRICS.inc("proxy_checks_total", (("protocol", valid_type or "none"), ("result", result)))
+        METRICS.observe("proxy_check_duration_seconds", elapsed, (("result", result),))
+
+    def _probe_proxy_types(self, proxy, proxy_types, retries=2, timeout=None):
+        connect_time = None
+        if self.sniff:
+            try:
+                reachable, detected, connect_time = sniff_proxy_protocol(
+                    proxy, self._resolve_judge_address(), self._timeout_for("connect", timeout))
+                if connect_time is not None:
+                    self._record_outcome("ok", "connect", connect_time)
+                proxy_types = self._candidate_types(proxy_types, reachable, detected)
+                if detected == SNIFF_SILENT:
+                    proxy_types, retries = self._order_by_hint(proxy, proxy_types)[:1], 1
+            except (OSError, ValueError):
+                pass
+        proxy_types = self._order_by_hint(proxy, proxy_types)
+
+        for proxy_type in proxy_types:
+            timings = self._try_proxy_type(proxy, proxy_type, retries, timeout, connect_time)
+            if timings:
+                return proxy_type, timings
+        return None, None
+
+    def _try_proxy_type(self, proxy, proxy_type, retries=2, timeout=None, connect_time=None):
+        try:
+            for attempt in range(retries):
+                try:
+                    proxies = {
+                        "http": f"{proxy_type}://{proxy}",
+                        "https": f"{proxy_type}://{proxy}"
+                    }
+                    with requests.Session() as session:
+                        session.trust_env = False
+                        start = time.perf_counter()
+                        response = session.get(self.judge_url, 
+                                              proxies=proxies, 
+                                              timeout=self._timeout_for(proxy_type, timeout), 
+                                              verify=False)
+                        if response.status_code == 200:
+                            total = time.perf_counter() - start
+                            self._record_outcome("ok", proxy_type, total)
+                            timings = {
+                                "connect": connect_time,
+                                "ttfb": response.elapsed.total_seconds(),
+                                "total": total
+                            }
+                            timings.update(classify_judge_response(response.content, self._judge_real_ip()))
+                            if proxy_type in ('http', 'https'):
+                                timings["tunnel"] = check_connect_tunnel(
+                                    proxy, proxy_type, self._judge_target(), self._timeout_for(proxy_type, timeout))
+                            else:
+                                timings["tunnel"] = True
+                            return timings
+                        self._record_outcome("error")
+                except (requests.exceptions.ConnectionError, 
+                       requests.exceptions.Timeout, 
+                       ConnectionResetError,
+                       requests.exceptions.ProxyError) as e:
+                    self._record_outcome(
+                        "timeout" if isinstance(e, requests.exceptions.Timeout) else "error", error=e)
+                    if attempt < retries - 1:
+                        time.sleep(self._retry_delay(proxy_type))
+                    continue
+                except Exception:
+                    break
+        except Exception:
+            pass
+        return None
+
+    def _store_result(self, proxy, valid_type, save_invalid=False, timings=None, source=None):
+        if self.source_stats:
+            self.source_stats.credit(proxy, valid_type)
+        if self.db:
+            self.db.record(proxy, valid_type, timings, source or self.current_source)
+
+        if valid_type:
+            self._add_proxy_to_file(f"{valid_type}://{proxy}", timings)
+        elif save_invalid:
+            self.store.add_invalid(proxy)
+
+    def _record_result(self, proxy, valid_type, save_invalid=False, timings=None, source=None):
+        self._store_result(proxy, valid_type, save_invalid, timings, source)
+
+        with self.lock:
+            if valid_type:
+                self.valid_count += 1
+            self.checked_count += 1
+            if self.checked_count % 10 == 0:
+                print(f'\rChecked: {self.checked_count}/{self.scraped_count} | Valid: {self.valid_count}', 
+                      end='', flush=True)
+
+    def check_single_proxy(self, proxy, proxy_types, retries=2, timeout=None):
+        valid_type, timings = self._check_proxy_types(proxy, proxy_types, retries, timeout)
+        if self.db:
+            self.db.record(proxy, valid_type, timings, "api")
+        return valid_type is not None, valid_type
+
+    def check_proxy_batch(self, proxy, proxy_types, save_invalid, semaphore):
+        with semaphore:
+            valid_type, timings = self._check_proxy_types(proxy, proxy_types)
+            self._record_result(proxy, valid_type, save_invalid, timings)
+
+    def _judge_real_ip(self):
+        with self.judge_lock:
+            if self.real_ip is None:
+                try:
+                    with requests.Session() as session:
+                        session.trust_env = False
+                        origin = session.get(self.judge_url, timeout=5, verify=False).json().get("origin", "")
+                    self.real_ip = str(origin).split(",")[0].strip()
+                except (requests.exceptions.RequestException, ValueError, AttributeError) as e:
+                    print(f"\n[Warning] Could not learn the real IP from judge {self.judge_url}: {e}")
+                    self.real_ip = ""
+            return self.real_ip or None
+
+    def _judge_target(self):
+        parsed = urlparse(self.judge_url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = f"{path}?{parsed.query}"
+        host_header = parsed.hostname if port == 80 else f"{parsed.hostname}:{port}"
+        return parsed.hostname, port, path, host_header
+
+    async def _async_probe(self, proxy, proxy_type, judge, timeout):
+        judge_host, judge_ip, judge_port, judge_path, host_header = judge
+        host, port = proxy.rsplit(':', 1)
+        ssl_context = _insecure_ssl_context() if proxy_type == 'https' else None
+
+        start = time.perf_counter()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, int(port), ssl=ssl_context), timeout)
+        connect_time = time.perf_counter() - start
+        try:
+            if proxy_type == 'socks4':
+                await _async_socks4_handshake(reader, writer, judge_ip, judge_port, timeout)
+                target = judge_path
+            elif proxy_type == 'socks5':
+                await _async_socks5_handshake(reader, writer, judge_ip, judge_port, timeout)
+                target = judge_path
+            else:
+                target = f"http://{host_header}{judge_path}"
+
+            keep_alive = proxy_type in ('http', 'https')
+            writer.write((f"GET {target} HTTP/1.1\r\n"
+                          f"Host: {host_header}\r\n"
+                          f"User-Agent: python-requests/{requests.__version__}\r\n"
+                          f"Accept: */*\r\n"
+                          f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode())
+            await writer.drain()
+
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            ttfb = time.perf_counter() - start
+            parts = status_line.split()
+            if len(parts) < 2 or not parts[0].startswith(b'HTTP/') or parts[1] != b'200':
+                return None
+
+            head = (await asyncio.wait_for(_read_header_block(reader), timeout)).lower()
+            length = _content_length(head)
+            if length is not None and length <= MAX_JUDGE_RESPONSE:
+                body = await asyncio.wait_for(reader.readexactly(length), timeout)
+            else:
+                body = await asyncio.wait_for(_read_to_eof(reader, MAX_JUDGE_RESPONSE), timeout)
+            timings = {"connect": connect_time, "ttfb": ttfb, "total": time.perf_counter() - start}
+            timings.update(classify_judge_response(body, self.real_ip))
+
+            if not keep_alive:
+                timings["tunnel"] = True
+            elif length is not None and b'connection: close' not in head and not reader.at_eof():
+                timings["tunnel"] = await self._async_connect_tunnel(reader, writer, judge, timeout)
+            else:
+                writer.close()
+                try:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(host, int(port), ssl=ssl_context), timeout)
+                    timings["tunnel"] = await self._async_connect_tunnel(reader, writer, judge, timeout)
+                except (OSError, asyncio.TimeoutError):
+                    timings["tunnel"] = False
+            return timings
+        finally:
+            writer.close()
+
+    async def _async_connect_tunnel(self, reader, writer, judge, timeout):
+        tunnel_host, tunnel_port = _tunnel_target(judge[0], judge[2])
+        try:
+            writer.write(_connect_request(tunnel_host, tunnel_port))
+            await writer.drain()
+            reply = (await asyncio.wait_for(reader.readline(), timeout)).split(None, 2)
+            return len(reply) > 1 and reply[0].startswith(b'HTTP/') and reply[1] == b'200'
+        except (OSError, asyncio.TimeoutError, ValueError):
+            return False
+
+    async def _async_check_proxy_types(self, proxy, proxy_types, judge, retries=2, timeout=None):
+        METRICS.inc("proxy_checks_in_flight")
+        start = time.perf_counter()
+        valid_type = None
+        try:
+            valid_type, timings = await self._async_probe_proxy_types(proxy, proxy_types, judge, retries, timeout)
+            return valid_type, timings
+        finally:
+            METRICS.inc("proxy_checks_in_flight", value=-1)
+            self._observe_check(valid_type, time.perf_counter() - start)
+
+    async def _async_probe_proxy_types(self, proxy, proxy_types, judge, retries=2, timeout=None):
+        if self.sniff:
+            try:
+                reachable, detected, connect_time = await async_sniff_proxy_protocol(
+                    proxy, (judge[1], judge[2]), self._timeout_for("connect", timeout))
+                if connect_time is not None:
+                    self._record_outcome("ok", "connect", connect_time)
+                proxy_types = self._candidate_types(proxy_types, reachable, detected)
+                if detected == SNIFF_SILENT:
+                    proxy_types, retries = self._order_by_hint(proxy, proxy_types)[:1], 1
+            except (OSError, ValueError):
+                pass
+        proxy_types = self._order_by_hint(proxy, proxy_types)
+
+        if self.race and len(proxy_types) > 1:
+            return await self._async_race_proxy_types(proxy, proxy_types, judge, retries, timeout)
+
+        for proxy_type in proxy_types:
+            timings = await self._async_try_proxy_type(proxy, proxy_type, judge, retries, timeout)
+            if timings:
+                return proxy_type, timings
+        return None, None
+
+    async def _async_try_proxy_type(self, proxy, proxy_type, judge, retries=2, timeout=None):
+        for attempt in range(retries):
+            try:
+                timings = await self._async_probe(proxy, proxy_type, judge,
+                                                  self._timeout_for(proxy_type, timeout))
+                if timings:
+                    self._record_outcome("ok", proxy_type, timings["total"])
+                    return timings
+                self._record_outcome("error")
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                self._record_outcome("timeout" if isinstance(e, asyncio.TimeoutError) else "error", error=e)
+                if attempt < retries - 1:
+                    await asyncio.sleep(self._retry_delay(proxy_type))
+                continue
+            except Exception:
+                break
+        return None
+
+    async def _async_race_proxy_types(self, proxy, proxy_types, judge, retries=2, timeout=None):
+        remaining = iter(proxy_types)
+        attempts = {}
+
+        def start_next():
+            proxy_type = next(remaining, None)
+            if proxy_type is None:
+                return False
+            task = asyncio.ensure_future(self._async_try_proxy_type(proxy, proxy_type, judge, retries, timeout))
+            attempts[task] = proxy_type
+            return True
+
+        more = start_next()
+        pending = set(attempts)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self.race_stagger if more else None,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    timings = task.result()
+                    if timings:
+                        return attempts[task], timings
+                if more:
+                    more = start_next()
+                    pending = {task for task in attempts if not task.done()}
+            return None, None
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _async_resolve_judge(self):
+        judge_host, judge_port, judge_path, host_header = self._judge_target()
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            judge_host, judge_port, family=socket.AF_INET, type=socket.SOCK_STREAM)
+        judge_ip = infos[0][4][0]
+        await asyncio.get_running_loop().run_in_executor(None, self._judge_real_ip)
+        return judge_host, judge_ip, judge_port, judge_path, host_header
+
+    async def _async_process_proxy_batch(self, proxies, proxy_types, save_invalid):
+        try:
+            judge = await self._async_resolve_judge()
+        except OSError as e:
+            print(f"\n[Error] Failed to resolve judge {self.judge_url}: {e}")
+            return
+
+        pending = asyncio.Queue(maxsize=self.max_threads * 2)
+        self._pending_queue = pending
+
+        async def producer():
+            try:
+                if self.prefilter:
+                    await self._async_feed_from_thread(proxies, pending)
+                else:
+                    for proxy in proxies:
+                        await pending.put(proxy)
+            finally:
+                for _ in range(self.max_threads):
+                    await pending.put(None)
+
+        async def worker():
+            while True:
+                proxy = await pending.get()
+                if proxy is None:
+                    return
+                if self.controller:
+                    await self.controller.acquire_async()
+                try:
+                    valid_type, timings = await self._async_check_proxy_types(proxy, proxy_types, judge)
+                except Exception:
+                    valid_type, timings = None, None
+                finally:
+                    if self.controller:
+                        self.controller.release()
+                self._record_result(proxy, valid_type, save_invalid, timings)
+
+        try:
+            await asyncio.gather(producer(), *(worker() for _ in range(self.max_threads)))
+        finally:
+            self._pending_queue = None
+
+    async def _async_feed_from_thread(self, proxies, pending):
+        loop = asyncio.get_running_loop()
+
+        def feed():
+            for proxy in proxies:
+                asyncio.run_coroutine_threadsafe(pending.put(proxy), loop).result()
+
+        await loop.run_in_executor(None, feed)
+
+    def iter_check_results(self, proxies, proxy_types, concurrency=None):
+        concurrency = max(1, min(concurrency or self.max_threads, self.max_threads, len(proxies) or 1))
+        pending = queue.Queue()
+        for proxy in proxies:
+            pending.put(proxy)
+        results = queue.Queue(maxsize=concurrency * 2)
+        cancelled = threading.Event()
+        done = object()
+
+        def deliver(item):
+            while not cancelled.is_set():
+                try:
+                    results.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def check(proxy):
+            try:
+                valid_type, timings = self._check_proxy_types(proxy, proxy_types)
+            except Exception:
+                valid_type, timings = None, None
+            if self.db:
+                self.db.record(proxy, valid_type, timings, "api")
+            return proxy, valid_type, timings
+
+        def thread_worker():
+            while not cancelled.is_set():
+                try:
+                    proxy = pending.get_nowait()
+                except queue.Empty:
+                    break
+                if not deliver(check(proxy)):
+                    break
+            deliver(done)
+
+        async def async_main():
+            async def worker(judge):
+                while not cancelled.is_set():
+                    try:
+                        proxy = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        valid_type, timings = await self._async_check_proxy_types(proxy, proxy_types, judge)
+                    except Exception:
+                        valid_type, timings = None, None
+                    if self.db:
+                        self.db.record(proxy, valid_type, timings, "api")
+                    while not cancelled.is_set():
+                        try:
+                            results.put_nowait((proxy, valid_type, timings))
+                            break
+                        except queue.Full:
+                            await asyncio.sleep(0.01)
+
+            try:
+                judge = await self._async_resolve_judge()
+                await asyncio.gather(*(worker(judge) for _ in range(concurrency)))
+            except OSError as e:
+                deliver(e)
+            finally:
+                deliver(done)
+
+        if self.engine == 'async':
+            workers = [threading.Thread(target=asyncio.run, args=(async_main(),), daemon=True)]
+        else:
+            workers = [threading.Thread(target=thread_worker, daemon=True) for _ in range(concurrency)]
+        for worker_thread in workers:
+            worker_thread.start()
+
+        remaining = len(workers)
+        try:
+            while remaining:
+                item = results.get()
+                if item is done:
+                    remaining -= 1
+                    continue
+                if isinstance(item, OSError):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    def _record_recheck(self, scheduler, proxy, valid_type, save_invalid, timings=None):
+        if self.source_stats:
+            self.source_stats.credit(proxy, valid_type)
+        if self.db:
+            self.db.record(proxy, valid_type, timings, self.current_source)
+
+        previous_type, first_check = scheduler.report(proxy, valid_type)
+        if previous_type and previous_type != valid_type:
+            self.store.remove(f"{previous_type}://{proxy}")
+        if valid_type:
+            self.store.add(f"{valid_type}://{proxy}", timings)
+        elif save_invalid and (first_check or previous_type):
+            self.store.add_invalid(proxy)
+
+        with self.lock:
+            self.checked_count += 1
+            self.valid_count = self.store.count()
+            if self.checked_count % 10 == 0:
+                print(f'\rChecked: {self.checked_count} | Valid: {self.valid_count} | Tracked: {len(scheduler)}', 
+                      end='', flush=True)
+
+    def _recheck_worker(self, scheduler, proxy_types, save_invalid):
+        while True:
+            proxy = scheduler.next_due()
+            if self.controller:
+                self.controller.acquire()
+            try:
+                valid_type, timings = self._check_proxy_types(proxy, proxy_types)
+            except Exception:
+                valid_type, timings = None, None
+            finally:
+                if self.controller:
+                    self.controller.release()
+            self._record_recheck(scheduler, proxy, valid_type, save_invalid, timings)
+
+    async def _async_recheck_loop(self, scheduler, proxy_types, save_invalid, retry_delay=5.0, max_retry_delay=300.0):
+        while True:
+            try:
+                judge = await self._async_resolve_judge()
+                break
+            except OSError as e:
+                print(f"\n[Error] Failed to resolve judge {self.judge_url}: {e} (retrying in {retry_delay:.0f}s)")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, max_retry_delay)
+
+        async def worker():
+            while True:
+                proxy = scheduler.pop_due()
+                if proxy is None:
+                    await asyncio.sleep(min(scheduler.seconds_until_next(), 1.0))
+                    continue
+                if self.controller:
+                    await self.controller.acquire_async()
+                try:
+                    valid_type, timings = await self._async_check_proxy_types(proxy, proxy_types, judge)
+                except Exception:
+                    valid_type, timings = None, None
+                finally:
+                    if self.controller:
+                        self.controller.release()
+                self._record_recheck(scheduler, proxy, valid_type, save_invalid, timings)
+
+        await asyncio.gather(*(worker() for _ in range(self.max_threads)))
+
+    def start_recheck_workers(self, scheduler, proxy_types, save_invalid):
+        self.scheduler = scheduler
+        if self.engine == 'async':
+            _raise_fd_limit()
+            thread = threading.Thread(target=asyncio.run,
+                                      args=(self._async_recheck_loop(scheduler, proxy_types, save_invalid),),
+                                      daemon=True)
+            thread.start()
+            return
+
+        for _ in range(self.max_threads):
+            thread = threading.Thread(target=self._recheck_worker,
+                                      args=(scheduler, proxy_types, save_invalid),
+                                      daemon=True)
+            thread.start()
+
+    def scrape_proxies(self, urls):
+        print("\n[Status] Scraping Proxies...")
+        urls = list(dict.fromkeys(urls))
+        self.protocol_hints = {}
+        if self.source_stats:
+            selected = self.source_stats.start_cycle(urls, prune=self.source_pruning)
+            if len(selected) < len(urls):
+                print(f"[Status] Skipping {len(urls) - len(selected)} low-yield sources this cycle")
+            urls = selected
+        proxies = set()
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.scrape_workers, len(urls)))) as pool:
+            results = list(zip(urls, pool.map(self._fetch_source, urls)))
+        for url, found in results:
+            proxies.update(found)
+
+        if self.source_cache:
+            self.source_cache.save()
+        if self.source_stats:
+            self.source_stats.attribute(results)
+            self.source_stats.save()
+
+        if self.geo is not None and (self.countries or self.asns):
+            proxies = self._geo_filtered(proxies)
+        return proxies
+
+    def _geo_filtered(self, proxies):
+        proxies = list(proxies)
+        kept = set()
+        locations = self.geo.lookup_many([proxy.rpartition(':')[0] for proxy in proxies])
+        for proxy, (country, asn) in zip(proxies, locations):
+            if (not self.countries or country in self.countries) and (not self.asns or asn in self.asns):
+                kept.add(proxy)
+        print(f"[Status] Geo filter kept {len(kept)} of {len(proxies)} proxies")
+        return kept
+
+    def _fetch_source(self, url):
+        start = time.perf_counter()
+        found, status = self._fetch_source_once(url)
+        labels = (("source", url),)
+        METRICS.inc("proxy_source_fetch_total", labels + (("status", status),))
+        METRICS.set("proxy_source_fetch_duration_seconds", time.perf_counter() - start, labels)
+        METRICS.set("proxy_source_proxies", len(found), labels)
+        if self.source_stats:
+            self.source_stats.record_fetch(url, time.perf_counter() - start, status)
+        return found
+
+    def _fetch_source_once(self, url):
+        cached = self.source_cache.get(url) if self.source_cache else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        for attempt in range(2):
+            try:
+                response = requests.get(_raw_source_url(url), headers=headers, timeout=10, verify=False)
+                if response.status_code == 304 and cached:
+                    self._add_protocol_hints(cached.get("hints"))
+                    return cached["proxies"], "not_modified"
+
+                if response.status_code == 200:
+                    body_hash = hashlib.sha1(response.content).hexdigest()
+                    if cached and cached.get("hash") == body_hash:
+                        found, hints = cached["proxies"], cached.get("hints")
+                    else:
+                        extracted = extract_proxies(response.content)
+                        found = list(extracted)
+                        hints = {proxy: hint for proxy, hint in extracted.items() if hint}
+                    self._add_protocol_hints(hints)
+
+                    if self.source_cache:
+                        self.source_cache.put(url, {
+                            "etag": response.headers.get("ETag"),
+                            "last_modified": response.headers.get("Last-Modified"),
+                            "hash": body_hash,
+                            "proxies": found,
+                            "hints": hints
+                        })
+                    return found, "ok"
+            except Exception:
+                if attempt < 1:
+                    time.sleep(0.2)
+                continue
+
+        return [], "error"
+
+    def _add_protocol_hints(self, hints):
+        if hints:
+            with self.lock:
+                self.protocol_hints.update(hints)
+
+    def _order_by_hint(self, proxy, proxy_types):
+        hint = self.protocol_hints.get(proxy)
+        if hint in proxy_types and proxy_types[0] != hint:
+            return [hint] + [proxy_type for proxy_type in proxy_types if proxy_type != hint]
+        return proxy_types
+
+    def check_from_file(self, filepath, proxy_types, save_invalid):
+        print(f"\n[Status] Checking proxies from {filepath}...")
+        self.current_source = f"file:{filepath}"
+
+        self.scraped_count = 0
+        self._process_proxy_batch(self._count_scraped(iter_proxy_file(filepath)), proxy_types, save_invalid)
+
+        print(f'\n\nChecking complete! Total: {self.checked_count}, Valid: {self.valid_count}')
+
+    def _count_scraped(self, proxies):
+        for proxy in proxies:
+            with self.lock:
+                self.scraped_count += 1
+            yield proxy
+
+    def scrape_and_check(self, urls, proxy_types, save_invalid):
+        self.current_source = "scrape"
+        proxies = self.scrape_proxies(urls)
+        self.scraped_count = len(proxies)
+        print(f"\n[Status] Found {self.scraped_count} proxies. Checking...")
+
+        proxy_list = list(proxies)
+        self._process_proxy_batch(proxy_list, proxy_types, save_invalid)
+        if self.source_stats:
+            self.source_stats.finish_cycle()
+
+        print(f'\n\nScraping and checking complete! Total: {self.checked_count}, Valid: {self.valid_count}')
+
+    def _process_proxy_batch(self, proxies, proxy_types, save_invalid):
+        try:
+            self._run_engine(proxies, proxy_types, save_invalid)
+        finally:
+            self.store.flush()
+            if self.db:
+                self.db.flush()
+
+    def _run_engine(self, proxies, proxy_types, save_invalid):
+        if self.role == 'coordinator':
+            self._run_coordinated(proxies, proxy_types, save_invalid)
+            return
+
+        if self.workers > 1:
+            self._run_sharded(proxies, proxy_types, save_invalid)
+            return
+
+        if self.prefilter:
+            proxies = self._prefiltered(proxies, save_invalid)
+
+        if self.engine == 'async':
+            _raise_fd_limit()
+            asyncio.run(self._async_process_proxy_batch(proxies, proxy_types, save_invalid))
+            return
+
+        semaphore = self.controller or BoundedSemaphore(self.max_threads)
+        pending = queue.Queue(maxsize=self.max_threads * 2)
+        self._pending_queue = pending
+
+        def worker():
+            while True:
+                proxy = pending.get()
+                if proxy is None:
+                    return
+                self.check_proxy_batch(proxy, proxy_types, save_invalid, semaphore)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.max_threads)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for proxy in proxies:
+                pending.put(proxy)
+        finally:
+            for thread in threads:
+                pending.put(None)
+            for thread in threads:
+                thread.join()
+            self._pending_queue = None
+
+
+    def _prefiltered(self, proxies, save_invalid):
+        _raise_fd_limit()
+        for proxy, connected in iter_connect_results(proxies, self.prefilter_timeout, self.prefilter_concurrency):
+            if connected:
+                yield proxy
+            else:
+                self._record_result(proxy, None, save_invalid)
+
+    def report_upstream_failure(self, proxy_entry):
+        self.store.remove(proxy_entry)
+        if self.scheduler:
+            self.scheduler.expedite(proxy_entry.split("://", 1)[-1])
+
+    def metric_gauges(self):
+        pending = self._pending_queue
+        gauges = [
+            ("proxy_check_queue_depth", "Proxies waiting for a free checker", pending.qsize() if pending else 0),
+            ("proxy_store_valid", "Valid proxies currently in the store", self.store.count()),
+            ("proxy_scraped", "Proxies read in the current cycle", self.scraped_count),
+            ("proxy_checked", "Proxies checked in the current cycle", self.checked_count),
+        ]
+        if self.db:
+            gauges.append(("proxy_db_queue_depth", "Check results waiting to be written", self.db.queue.qsize()))
+        if self.lease_queue:
+            gauges.append(("proxy_leases_active", "Chunks leased to workers", len(self.lease_queue.leases)))
+        if self.controller:
+            gauges.append(("proxy_concurrency_limit", "Current adaptive in-flight check limit", self.controller.limit))
+        if self.gateway:
+            stats = self.gateway.stats()
+            gauges.append(("proxy_gateway_clients", "Client connections open on the gateway", stats["clients"]))
+            gauges.append(("proxy_gateway_upstreams", "Upstreams the gateway can currently route to", stats["upstreams"]))
+        return gauges
+
+    def _run_coordinated(self, proxies, proxy_types, save_invalid):
+        self.lease_queue = LeaseQueue(proxies, proxy_types, self.judge_url,
+                                      chunk_size=self.lease_size, lease_timeout=self.lease_timeout,
+                                      hints=self.protocol_hints)
+        self.lease_save_invalid = save_invalid
+        print(f"\n[Coordinator] Waiting for workers to lease chunks of {self.lease_size} proxies...")
+        try:
+            self.lease_queue.wait()
+        finally:
+            self.lease_queue = None
+
+    def submit_lease_results(self, lease_id, results, final=False):
+        lease_queue = self.lease_queue
+        if lease_queue is None:
+            return 0, True
+        accepted, expired = lease_queue.complete(lease_id, results, final)
+        for proxy, valid_type, timings in accepted:
+            self._record_result(proxy, valid_type, self.lease_save_invalid, timings)
+        return len(accepted), expired
+
+    def _shard_options(self):
+        return {
+            "max_threads": self.max_threads,
+            "engine": self.engine,
+            "sniff": self.sniff,
+            "judge_url": self.judge_url,
+            "prefilter": self.prefilter,
+            "prefilter_timeout": self.prefilter_timeout,
+            "prefilter_concurrency": self.prefilter_concurrency,
+            "adaptive": self.adaptive,
+            "race": self.race,
+            "race_stagger": self.race_stagger
+        }
+
+    def _run_sharded(self, proxies, proxy_types, save_invalid, chunk_size=500):
+        context = multiprocessing.get_context('spawn')
+        counters = context.Array('q', self.workers * 2, lock=False)
+        results = context.Queue(maxsize=self.workers * 64)
+        inputs = [context.Queue(maxsize=8) for _ in range(self.workers)]
+        processes = [context.Process(target=_shard_worker,
+                                     args=(index, self._shard_options(), proxy_types, save_invalid,
+                                           inputs[index], results, counters),
+                                     daemon=True)
+                     for index in range(self.workers)]
+        for process in processes:
+            process.start()
+
+        base_checked, base_valid = self.checked_count, self.valid_count
+        finished = threading.Event()
+
+        def collect():
+            remaining = self.workers
+            while remaining:
+                message = results.get()
+                if message is None:
+                    remaining -= 1
+                    continue
+                batch, metrics = message
+                METRICS.absorb(metrics)
+                for proxy, valid_type, timings in batch:
+                    self._store_result(proxy, valid_type, save_invalid, timings)
+
+        def monitor():
+            last_printed = None
+            while not finished.wait(0.5):
+                checked = base_checked + sum(counters[0::2])
+                with self.lock:
+                    self.checked_count = checked
+                    self.valid_count = base_valid + sum(counters[1::2])
+                if checked != last_printed:
+                    last_printed = checked
+                    print(f'\rChecked: {self.checked_count}/{self.scraped_count} | Valid: {self.valid_count} '
+                          f'| Workers: {self.workers}', end='', flush=True)
+
+        collector = threading.Thread(target=collect, daemon=True)
+        collector.start()
+        monitor_thread = threading.Thread(target=monitor, daemon=True)
+        monitor_thread.start()
+
+        chunks = [[] for _ in range(self.workers)]
+        try:
+            for proxy in proxies:
+                index = zlib.crc32(proxy.encode()) % self.workers
+                chunks[index].append((proxy, self.protocol_hints.get(proxy)))
+                if len(chunks[index]) >= chunk_size:
+                    inputs[index].put(chunks[index])
+                    chunks[index] = []
+        finally:
+            for index, chunk in enumerate(chunks):
+                if chunk:
+                    inputs[index].put(chunk)
+                inputs[index].put(None)
+
+            collector.join()
+            for process in processes:
+                process.join()
+            finished.set()
+            monitor_thread.join()
+            with self.lock:
+                self.checked_count = base_checked + sum(counters[0::2])
+                self.valid_count = base_valid + sum(counters[1::2])
+
+
+class ShardChecker(ProxyChecker):
+    def __init__(self, index, options, results, counters, batch_size=100, batch_interval=0.5):
+        super().__init__(output_file=None, max_threads=options["max_threads"],
+                         engine=options["engine"], sniff=options["sniff"],
+                         prefilter=options["prefilter"], prefilter_timeout=options["prefilter_timeout"],
+                         prefilter_concurrency=options["prefilter_concurrency"],
+                         adaptive=options["adaptive"], race=options["race"],
+                         race_stagger=options["race_stagger"])
+        self.judge_url = options["judge_url"]
+        self.index = index
+        self.results = results
+        self.counters = counters
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.batch = []
+        self.batch_started = time.monotonic()
+
+    def _initialize_output_file(self, clear_invalid=False):
+        pass
+
+    def _record_result(self, proxy, valid_type, save_invalid=False, timings=None, source=None):
+        with self.lock:
+            self.counters[self.index * 2] += 1
+            if valid_type:
+                self.counters[self.index * 2 + 1] += 1
+            if valid_type or save_invalid:
+                self.batch.append((proxy, valid_type, timings))
+            if len(self.batch) >= self.batch_size or time.monotonic() - self.batch_started >= self.batch_interval:
+                batch, self.batch = self.batch, []
+                self.batch_started = time.monotonic()
+            else:
+                batch = None
+        if batch is not None:
+            self.results.put((batch, METRICS.drain()))
+
+    def flush_results(self):
+        with self.lock:
+            batch, self.batch = self.batch, []
+        self.results.put((batch, METRICS.drain()))
+
+
+def _iter_shard_input(inputs, hints):
+    while True:
+        chunk = inputs.get()
+        if chunk is None:
+            return
+        for proxy, hint in chunk:
+            if hint:
+                hints[proxy] = hint
+            yield proxy
+
+
+def _shard_worker(index, options, proxy_types, save_invalid, inputs, results, counters):
+    try:
+        checker = ShardChecker(index, options, results, counters)
+        checker._run_engine(_iter_shard_input(inputs, checker.protocol_hints), proxy_types, save_invalid)
+        checker.flush_results()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        results.put(None)
+
+
+PROXY_ADDRESS = r'(?!127\.)\d{1,3}(?:\.\d{1,3}){3}:\d{2,5}'
+
+PROTOCOL_HINTS = {
+    'http': 'http',
+    'https': 'http',
+    'socks4': 'socks4',
+    'socks4a': 'socks4',
+    'socks5': 'socks5',
+    'socks5h': 'socks5'
+}
+
+INLINE_PROXY_PATTERN = re.compile(r'(?<![\w.@])' + PROXY_ADDRESS + r'(?![\d.])', re.ASCII)
+HINTED_PROXY_PATTERN = re.compile(
+    r'\b(https?|socks4a?|socks5h?)://(' + PROXY_ADDRESS + r')(?![\d.])', re.ASCII | re.IGNORECASE)
+HTML_CELL_PROXY_PATTERN = re.compile(
+    r'>\s*((?!127\.)\d{1,3}(?:\.\d{1,3}){3})\s*</td>\s*<td[^>]*>\s*(\d{2,5})\s*<', re.ASCII | re.IGNORECASE)
+VALID_PROXY_PATTERN = re.compile(PROXY_ADDRESS, re.ASCII)
+GITHUB_BLOB_PATTERN = re.compile(r'^https?://github\.com/([^/]+)/([^/]+)/blob/(.+)$')
+
+JSON_HOST_KEYS = ('ip', 'host', 'address', 'addr', 'ip_address')
+JSON_PROTOCOL_KEYS = ('protocol', 'protocols', 'type', 'types', 'scheme')
+
+
+def _protocol_hint(protocol):
+    if isinstance(protocol, list):
+        protocol = protocol[0] if protocol else None
+    return PROTOCOL_HINTS.get(protocol.lower()) if isinstance(protocol, str) else None
+
+
+def _extract_inline(text):
+    found = dict.fromkeys(INLINE_PROXY_PATTERN.findall(text))
+    if '://' in text:
+        found.update({proxy: PROTOCOL_HINTS[protocol.lower()] for protocol, proxy in HINTED_PROXY_PATTERN.findall(text)})
+    return found
+
+
+def _extract_html_table(text):
+    if '<td' not in text and '<TD' not in text:
+        return {}
+    return dict.fromkeys(f"{ip}:{port}" for ip, port in HTML_CELL_PROXY_PATTERN.findall(text))
+
+
+def _extract_json(text):
+    if text.lstrip()[:1] not in ('{', '['):
+        return {}
+    try:
+        stack = [json.loads(text)]
+    except ValueError:
+        return {}
+
+    found = {}
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            host = next((item[key] for key in JSON_HOST_KEYS if isinstance(item.get(key), str)), None)
+            proxy = f"{host}:{item.get('port')}"
+            if host and VALID_PROXY_PATTERN.fullmatch(proxy):
+                found[proxy] = _protocol_hint(next((item[key] for key in JSON_PROTOCOL_KEYS if item.get(key)), None))
+            stack.extend(value for value in item.values() if isinstance(value, (list, dict)))
+    return found
+
+
+EXTRACTORS = [_extract_inline, _extract_html_table, _extract_json]
+
+
+def register_extractor(extractor):
+    EXTRACTORS.append(extractor)
+    return extractor
+
+
+def extract_proxies(body, extractors=None):
+    text = body.decode('latin-1') if isinstance(body, bytes) else body
+    found = {}
+    for extractor in extractors or EXTRACTORS:
+        result = extractor(text)
+        if not found:
+            found = result
+            continue
+        for proxy, hint in result.items():
+            if hint or proxy not in found:
+                found[proxy] = hint
+    return found
+
+
+def _raw_source_url(url):
+    return GITHUB_BLOB_PATTERN.sub(r'https://raw.githubusercontent.com/\1/\2/\3', url)
+
+
+class PackedProxySet:
+    def __init__(self, capacity=1024):
+        size = 1
+        while size < capacity * 2:
+            size <<= 1
+        self.slots = array.array('Q', bytes(8 * size))
+        self.mask = size - 1
+        self.used = 0
+        self.others = set()
+
+    def __len__(self):
+        return self.used + len(self.others)
+
+    @staticmethod
+    def pack(proxy):
+        host, _, port = proxy.rpartition(':')
+        try:
+            packed_ip = socket.inet_aton(host)
+            port = int(port)
+        except (OSError, ValueError):
+            return None
+        if host.count('.') != 3 or not 0 < port < 65536:
+            return None
+        return ((int.from_bytes(packed_ip, 'big') << 16) | port) + 1
+
+    def add(self, proxy):
+        key = self.pack(proxy)
+        if key is None:
+            if proxy.rpartition(':')[0].replace('.', '').isdigit() or proxy in self.others:
+                return False
+            self.others.add(proxy)
+            return True
+
+        index = (key * 0x9E3779B97F4A7C15 >> 20) & self.mask
+        while True:
+            slot = self.slots[index]
+            if slot == 0:
+                break
+            if slot == key:
+                return False
+            index = (index + 1) & self.mask
+
+        self.slots[index] = key
+        self.used += 1
+        if self.used * 10 > len(self.slots) * 6:
+            self._grow()
+        return True
+
+    def _grow(self):
+        old_slots = self.slots
+        self.slots = array.array('Q', bytes(16 * len(old_slots)))
+        self.mask = len(self.slots) - 1
+        for key in old_slots:
+            if key:
+                index = (key * 0x9E3779B97F4A7C15 >> 20) & self.mask
+                while self.slots[index]:
+                    index = (index + 1) & self.mask
+                self.slots[index] = key
+
+
+COUNTRY_CODE_PATTERN = re.compile(r'^[A-Za-z]{2}$')
+ASN_PATTERN = re.compile(r'^(?:AS)?(\d+)$', re.IGNORECASE)
+
+
+def _parse_asns(value):
+    asns = []
+    for part in value.split(','):
+        match = ASN_PATTERN.match(part.strip())
+        if not match:
+            raise ValueError(part)
+        asns.append(int(match.group(1)))
+    return asns
+
+
+def _ipv4_to_int(value):
+    if value.isdigit():
+        number = int(value)
+        return number if number < 1 << 32 else None
+    try:
+        packed_ip = socket.inet_aton(value)
+    except OSError:
+        return None
+    return int.from_bytes(packed_ip, 'big') if value.count('.') == 3 else None
+
+
+class IPRangeIndex:
+    def __init__(self, ranges):
+        ranges.sort()
+        self.countries = [None]
+        country_ids = {None: 0}
+        starts, ends, countries, asns = [], [], [], []
+        for start, end, country, asn in ranges:
+            starts.append(start)
+            ends.append(end)
+            countries.append(country_ids.setdefault(country, len(country_ids)))
+            asns.append(asn or 0)
+        self.countries.extend(country for country in country_ids if country is not None)
+
+        if numpy is not None:
+            self.starts = numpy.array(starts, dtype=numpy.uint32)
+            self.ends = numpy.array(ends, dtype=numpy.uint32)
+            self.country_ids = numpy.array(countries, dtype=numpy.uint16)
+            self.asns = numpy.array(asns, dtype=numpy.uint32)
+        else:
+            self.starts = array.array('I', starts)
+            self.ends = array.array('I', ends)
+            self.country_ids = array.array('H', countries)
+            self.asns = array.array('I', asns)
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def load(cls, path):
+        ranges = []
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            sample = f.readline()
+            f.seek(0)
+            for row in csv.reader(f, delimiter='\t' if '\t' in sample else ','):
+                if len(row) < 3:
+                    continue
+                start, end = _ipv4_to_int(row[0].strip()), _ipv4_to_int(row[1].strip())
+                if start is None or end is None or end < start:
+                    continue
+                country = asn = None
+                for field in row[2:]:
+                    field = field.strip()
+                    if country is None and COUNTRY_CODE_PATTERN.match(field):
+                        country = field.upper()
+                    elif asn is None and ASN_PATTERN.match(field):
+                        asn = int(ASN_PATTERN.match(field).group(1)) or None
+                ranges.append((start, end, country, asn))
+        return cls(ranges)
+
+    def lookup(self, ip):
+        key = _ipv4_to_int(ip)
+        if key is None or not len(self.starts):
+            return None, None
+        if numpy is not None:
+            position = int(numpy.searchsorted(self.starts, numpy.uint32(key), side='right')) - 1
+        else:
+            position = bisect.bisect_right(self.starts, key) - 1
+        if position >= 0 and key <= self.ends[position]:
+            return self.countries[self.country_ids[position]], int(self.asns[position]) or None
+        return None, None
+
+    def lookup_many(self, ips):
+        keys = [_ipv4_to_int(ip) for ip in ips]
+        if not len(self.starts):
+            return [(None, None)] * len(keys)
+
+        if numpy is not None:
+            valid = numpy.array([key is not None for key in keys], dtype=bool)
+            values = numpy.array([key or 0 for key in keys], dtype=numpy.uint32)
+            positions = numpy.searchsorted(self.starts, values, side='right').astype(numpy.int64) - 1
+            clipped = positions.clip(0)
+            hits = (valid & (positions >= 0) & (values <= self.ends[clipped])).tolist()
+            country_ids = self.country_ids[clipped].tolist()
+            asns = self.asns[clipped].tolist()
+            return [(self.countries[country_ids[i]], asns[i] or None) if hit else (None, None)
+                    for i, hit in enumerate(hits)]
+
+        results = []
+        for key in keys:
+            position = -1 if key is None else bisect.bisect_right(self.starts, key) - 1
+            if position >= 0 and key <= self.ends[position]:
+                results.append((self.countries[self.country_ids[position]], self.asns[position] or None))
+            else:
+                results.append((None, None))
+        return results
+
+
+PROXY_LINE_PATTERN = re.compile(r'^(?:[a-z0-9]+://)?([^\s:/]+:\d{1,5})/?$', re.IGNORECASE)
+
+
+def iter_proxy_file(filepath):
+    seen = PackedProxySet()
+    with open(filepath, "r", errors="ignore") as file:
+        for line in file:
+            match = PROXY_LINE_PATTERN.match(line.strip())
+            if match and seen.add(match.group(1)):
+                yield match.group(1)
+
+
+MAX_JUDGE_RESPONSE = 64 * 1024
+
+TIMING_KEYS = ("connect", "ttfb", "total")
+PROFILE_KEYS = ("anonymity", "leaked", "exit_ip", "tunnel")
+ANONYMITY_LEVELS = ("transparent", "anonymous", "elite")
+IP_TOKEN_SEPARATORS = re.compile(r'[\s,;="]+')
+PROXY_REVEALING_HEADERS = frozenset((
+    'via', 'forwarded', 'x-forwarded-for', 'x-forwarded-host', 'x-forwarded-proto', 'x-forwarded-server',
+    'x-real-ip', 'client-ip', 'x-client-ip', 'x-originating-ip', 'x-remote-ip', 'x-remote-addr',
+    'forwarded-for', 'x-proxy-id', 'proxy-connection', 'proxy-client-ip', 'wl-proxy-client-ip',
+    'x-bluecoat-via', 'x-proxy-connection', 'x-cache', 'x-cache-lookup'
+))
+
+
+def _parse_ip(token):
+    token = token.strip('[]')
+    try:
+        return ipaddress.ip_address(token)
+    except ValueError:
+        pass
+    host, _, port = token.rpartition(':')
+    if port.isdigit():
+        try:
+            return ipaddress.ip_address(host.strip('[]'))
+        except ValueError:
+            pass
+    return None
+
+
+def _ip_tokens(value):
+    tokens = set()
+    for token in IP_TOKEN_SEPARATORS.split(value):
+        address = _parse_ip(token) if token else None
+        if address is not None:
+            tokens.add(address)
+    return tokens
+
+
+def classify_judge_response(body, real_ip=None):
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    headers = data.get("headers")
+    headers = {str(name).lower(): str(value) for name, value in headers.items()} if isinstance(headers, dict) else {}
+    origins = [part.strip() for part in str(data.get("origin", "")).split(",") if part.strip()]
+    leaked = sorted(name for name in headers if name in PROXY_REVEALING_HEADERS)
+
+    forwarded = set()
+    for value in origins[:-1] + [headers[name] for name in leaked]:
+        forwarded.update(_ip_tokens(value))
+    if real_ip and _parse_ip(real_ip) in forwarded:
+        anonymity = "transparent"
+    elif leaked or len(origins) > 1:
+        anonymity = "anonymous"
+    else:
+        anonymity = "elite"
+    return {"anonymity": anonymity, "leaked": leaked, "exit_ip": origins[-1] if origins else None}
+
+
+def _tunnel_target(judge_host, judge_port):
+    return judge_host, 443 if judge_port == 80 else judge_port
+
+
+def _connect_request(host, port):
+    return f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode()
+
+
+def _content_length(head):
+    for line in head.split(b'\r\n'):
+        name, _, value = line.partition(b':')
+        if name.strip() == b'content-length':
+            try:
+                return int(value.strip())
+            except ValueError:
+                return None
+    return None
+
+
+async def _read_header_block(reader):
+    lines = []
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            return b''.join(lines)
+        lines.append(line)
+
+
+async def _read_to_eof(reader, limit):
+    chunks = []
+    size = 0
+    while size < limit:
+        chunk = await reader.read(limit - size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b''.join(chunks)
+
+
+def check_connect_tunnel(proxy, proxy_type, judge_target, timeout=2):
+    host, port = proxy.rsplit(':', 1)
+    tunnel_host, tunnel_port = _tunnel_target(judge_target[0], judge_target[1])
+    try:
+        with socket.create_connection((host, int(port)), timeout) as raw:
+            sock = _insecure_ssl_context().wrap_socket(raw) if proxy_type == 'https' else raw
+            sock.settimeout(timeout)
+            sock.sendall(_connect_request(tunnel_host, tunnel_port))
+            reply = sock.recv(1024).split(None, 2)
+            return len(reply) > 1 and reply[0].startswith(b'HTTP/') and reply[1] == b'200'
+    except (OSError, ValueError):
+        return False
+
+
+SNIFF_SILENT = 'silent'
+SNIFF_PROBE = b'\x05\x01\x00\r\n\r\n\r\n'
+
+
+def _socks4_request(dest_ip, dest_port):
+    return struct.pack('>BBH', 4, 1, dest_port) + socket.inet_aton(dest_ip) + b'\x00'
+
+
+def _classify_handshake(data):
+    if not data:
+        return None
+    if data[0] == 0x05:
+        return 'socks5'
+    if data.startswith(b'HTTP/'):
+        return 'http'
+    if len(data) >= 2 and data[0] in (0x15, 0x16) and data[1] == 0x03:
+        return 'https'
+    if len(data) >= 2 and data[0] == 0x00 and 0x5A <= data[1] <= 0x5D:
+        return 'socks4'
+    return None
+
+
+def iter_connect_results(proxies, timeout=1.0, concurrency=1024):
+    selector = selectors.DefaultSelector()
+    in_flight = {}
+    deadlines = deque()
+    source = iter(proxies)
+    exhausted = False
+    deferred = None
+
+    def close(sock):
+        selector.unregister(sock)
+        sock.close()
+        return in_flight.pop(sock)
+
+    try:
+        while True:
+            while not exhausted and len(in_flight) < concurrency:
+                proxy, deferred = deferred or next(source, None), None
+                if proxy is None:
+                    exhausted = True
+                    break
+                host, _, port = proxy.rpartition(':')
+                try:
+                    socket.inet_aton(host)
+                    address = (host, int(port))
+                except (OSError, ValueError):
+                    yield proxy, True
+                    continue
+
+                try:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                except OSError as e:
+                    if e.errno in (errno.EMFILE, errno.ENFILE) and in_flight:
+                        concurrency = max(1, len(in_flight) // 2)
+                        deferred = proxy
+                        print(f"[Warning] Out of file descriptors; prefilter concurrency lowered to {concurrency}")
+                        break
+                    METRICS.inc("proxy_prefilter_total", (("result", "closed"),))
+                    yield proxy, False
+                    continue
+                sock.setblocking(False)
+                try:
+                    result = sock.connect_ex(address)
+                except (OSError, OverflowError):
+                    result = errno.EINVAL
+                if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    sock.close()
+                    METRICS.inc("proxy_prefilter_total", (("result", "closed"),))
+                    yield proxy, False
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE)
+                in_flight[sock] = proxy
+                deadlines.append((time.monotonic() + timeout, sock))
+
+            while deadlines and deadlines[0][1] not in in_flight:
+                deadlines.popleft()
+            if not deadlines:
+                if exhausted:
+                    return
+                continue
+
+            for key, events in selector.select(max(0.0, deadlines[0][0] - time.monotonic())):
+                sock = key.fileobj
+                connected = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                proxy = close(sock)
+                METRICS.inc("proxy_prefilter_total", (("result", "open" if connected else "closed"),))
+                yield proxy, connected
+
+            now = time.monotonic()
+            while deadlines and (deadlines[0][1] not in in_flight or deadlines[0][0] <= now):
+                deadline, sock = deadlines.popleft()
+                if sock in in_flight:
+                    METRICS.inc("proxy_prefilter_total", (("result", "timeout"),))
+                    yield close(sock), False
+    finally:
+        for sock in list(in_flight):
+            close(sock)
+        selector.close()
+
+
+def sniff_proxy_protocol(proxy, judge_address, timeout=2):
+    host, port = proxy.rsplit(':', 1)
+    try:
+        start = time.perf_counter()
+        sock = socket.create_connection((host, int(port)), timeout=timeout)
+        connect_time = time.perf_counter() - start
+    except OSError:
+        return False, None, None
+
+    try:
+        sock.sendall(SNIFF_PROBE)
+        protocol = _classify_handshake(sock.recv(64))
+        if protocol:
+            return True, protocol, connect_time
+    except socket.timeout:
+        return True, SNIFF_SILENT, connect_time
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout) as sock:
+            sock.sendall(_socks4_request(*judge_address))
+            protocol = _classify_handshake(sock.recv(8))
+            return True, protocol if protocol == 'socks4' else None, connect_time
+    except OSError:
+        return True, None, connect_time
+
+
+async def async_sniff_proxy_protocol(proxy, judge_address, timeout=2):
+    host, port = proxy.rsplit(':', 1)
+    try:
+        start = time.perf_counter()
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+        connect_time = time.perf_counter() - start
+    except (OSError, asyncio.TimeoutError):
+        return False, None, None
+
+    try:
+        writer.write(SNIFF_PROBE)
+        await writer.drain()
+        protocol = _classify_handshake(await asyncio.wait_for(reader.read(64), timeout))
+        if protocol:
+            return True, protocol, connect_time
+    except asyncio.TimeoutError:
+        return True, SNIFF_SILENT, connect_time
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return True, None, connect_time
+    try:
+        writer.write(_socks4_request(*judge_address))
+        await writer.drain()
+        protocol = _classify_handshake(await asyncio.wait_for(reader.read(8), timeout))
+        return True, protocol if protocol == 'socks4' else None, connect_time
+    except (OSError, asyncio.TimeoutError):
+        return True, None, connect_time
+    finally:
+        writer.close()
+
+
+_insecure_context = None
+_insecure_context_lock = Lock()
+
+
+def _insecure_ssl_context():
+    global _insecure_context
+    if _insecure_context is None:
+        with _insecure_context_lock:
+            if _insecure_context is None:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+                _insecure_context = context
+    return _insecure_context
+
+
+def _raise_fd_limit():
+    if resource is None:
+        return
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or hard > soft:
+            target = 65535 if hard == resource.RLIM_INFINITY else hard
+            resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, target), hard))
+    except (ValueError, OSError):
+        pass
+
+
+class TargetUnreachable(ConnectionError):
+    pass
+
+
+async def _async_socks4_handshake(reader, writer, dest_ip, dest_port, timeout):
+    writer.write(_socks4_request(dest_ip, dest_port))
+    await writer.drain()
+    reply = await asyncio.wait_for(reader.readexactly(8), timeout)
+    if reply[1] != 0x5A:
+        raise TargetUnreachable(f"SOCKS4 request rejected (0x{reply[1]:02x})")
+
+
+def _encode_hostname(host):
+    try:
+        hostname = host.encode('idna')
+    except UnicodeError:
+        return None
+    return hostname if 0 < len(hostname) <= 255 else None
+
+
+async def _async_socks5_handshake(reader, writer, dest_ip, dest_port, timeout):
+    writer.write(b'\x05\x01\x00')
+    await writer.drain()
+    greeting = await asyncio.wait_for(reader.readexactly(2), timeout)
+    if greeting[0] != 5 or greeting[1] != 0:
+        raise ConnectionError("SOCKS5 greeting rejected")
+
+    try:
+        address = b'\x01' + socket.inet_aton(dest_ip)
+    except OSError:
+        hostname = _encode_hostname(dest_ip)
+        if hostname is None:
+            raise TargetUnreachable(f"Invalid SOCKS5 hostname {dest_ip[:64]!r}")
+        address = b'\x03' + bytes([len(hostname)]) + hostname
+    writer.write(b'\x05\x01\x00' + address + struct.pack('>H', dest_port))
+    await writer.drain()
+    reply = await asyncio.wait_for(reader.readexactly(4), timeout)
+    if reply[0] != 5:
+        raise ConnectionError("Malformed SOCKS5 reply")
+    if reply[1] != 0:
+        raise TargetUnreachable(f"SOCKS5 connect rejected (0x{reply[1]:02x})")
+
+    if reply[3] == 1:
+        await asyncio.wait_for(reader.readexactly(6), timeout)
+    elif reply[3] == 3:
+        length = await asyncio.wait_for(reader.readexactly(1), timeout)
+        await asyncio.wait_for(reader.readexactly(length[0] + 2), timeout)
+    elif reply[3] == 4:
+        await asyncio.wait_for(reader.readexactly(18), timeout)
+
+
+async def _async_http_connect(reader, writer, dest_host, dest_port, timeout):
+    writer.write(f"CONNECT {dest_host}:{dest_port} HTTP/1.1\r\nHost: {dest_host}:{dest_port}\r\n\r\n".encode())
+    await writer.drain()
+    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+    parts = head.split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+        raise ConnectionError("Malformed CONNECT reply")
+    if parts[1] in (b'403', b'405', b'407'):
+        raise ConnectionError(f"CONNECT refused ({parts[1].decode()})")
+    if parts[1] != b'200':
+        raise TargetUnreachable(f"CONNECT failed ({parts[1].decode(errors='replace')})")
+
+
+class UpstreamBalancer:
+    def __init__(self, max_connections=8, latency_alpha=0.3, default_latency=1.0, eject_interval=300, max_rejections=3):
         self.lock = Lock()
-        self.file_lock = Lock()
-        self.checked_count = 0
-        self.valid_count = 0
-        self.scraped_count = 0
-        self.output_file = output_file
-        self.max_threads = max_threads
-        self.last_run = None
-        self._initialize_output_file()
+        self.max_connections = max_connections
+        self.max_rejections = max_rejections
+        self.latency_alpha = latency_alpha
+        self.default_latency = default_latency
+        self.eject_interval = eject_interval
+        self.upstreams = {}
+        self.entries = []
+        self.ejected = {}
+        self.ejections = 0
 
-    def _initialize_output_file(self):
+    def refresh(self, entries):
+        now = time.monotonic()
         with self.lock:
-            with open(self.output_file, 'w') as f:
-                json.dump({
-                    "proxies": [], 
-                    "count": 0, 
-                    "last_updated": time.time(),
-                    "last_check": None
-                }, f)
+            self.ejected = {entry: until for entry, until in self.ejected.items() if until > now}
+            upstreams = {}
+            for entry, latency in entries:
+                if entry in self.ejected:
+                    continue
+                state = self.upstreams.get(entry)
+                if state is None:
+                    state = {"latency": latency or self.default_latency, "active": 0, "requests": 0, "rejections": 0}
+                upstreams[entry] = state
+            self.upstreams = upstreams
+            self.entries = list(upstreams)
 
-    def _add_proxy_to_file(self, proxy_string):
-        with self.file_lock:
-            try:
-                with open(self.output_file, 'r') as f:
-                    data = json.load(f)
+    def _available_locked(self, entry, exclude):
+        return entry not in exclude and self.upstreams[entry]["active"] < self.max_connections
 
-                data["proxies"].append(proxy_string)
-                data["count"] = len(data["proxies"])
-                data["last_updated"] = time.time()
+    def acquire(self, exclude=()):
+        with self.lock:
+            entries = self.entries
+            candidates = []
+            for _ in range(min(len(entries), 8)):
+                entry = entries[random.randrange(len(entries))]
+                if entry not in candidates and self._available_locked(entry, exclude):
+                    candidates.append(entry)
+                    if len(candidates) == 2:
+                        break
+            if not candidates:
+                available = [entry for entry in entries if self._available_locked(entry, exclude)]
+                candidates = random.sample(available, min(len(available), 2))
+            if not candidates:
+                return None
 
-                temp_file = f"{self.output_file}.tmp"
-                with open(temp_file, 'w') as f:
-                    json.dump(data, f, separators=(',', ':'))
+            entry = min(candidates, key=lambda entry: self.upstreams[entry]["latency"] * (self.upstreams[entry]["active"] + 1))
+            state = self.upstreams[entry]
+            state["active"] += 1
+            state["requests"] += 1
+            return entry
 
-                os.replace(temp_file, self.output_file)
+    def observe(self, entry, latency):
+        with self.lock:
+            state = self.upstreams.get(entry)
+            if state is not None:
+                state["latency"] += self.latency_alpha * (latency - state["latency"])
+                state["rejections"] = 0
 
-            except Exception as e:
-                print(f"\n[Error] Failed to write proxy: {e}")
+    def release(self, entry, failed=False, rejected=False):
+        with self.lock:
+            state = self.upstreams.get(entry)
+            if state is None:
+                return False
+            state["active"] = max(0, state["active"] - 1)
+            if rejected:
+                state["rejections"] += 1
+                failed = state["rejections"] >= self.max_rejections
+            if failed:
+                del self.upstreams[entry]
+                self.entries.remove(entry)
+                self.ejected[entry] = time.monotonic() + self.eject_interval
+                self.ejections += 1
+            return failed
 
-    def _read_proxies_from_file(self):
+
+def _parse_gateway_request(head):
+    request_line, _, header_block = head[:-4].partition(b'\r\n')
+    parts = request_line.split()
+    if len(parts) != 3:
+        return None
+
+    method, target, version = parts
+    if method == b'CONNECT':
+        host, _, port = target.decode('latin-1').rpartition(':')
+        if not host or not port.isdigit() or _encode_hostname(host.strip('[]')) is None:
+            return None
+        return host.strip('[]'), int(port), None
+
+    url = urlparse(target.decode('latin-1'))
+    try:
+        port = url.port or 80
+    except ValueError:
+        return None
+    if url.scheme != 'http' or not url.hostname or _encode_hostname(url.hostname) is None:
+        return None
+
+    path = (url.path or '/') + (f";{url.params}" if url.params else '') + (f"?{url.query}" if url.query else '')
+    headers = [line for line in header_block.split(b'\r\n')
+               if line and not line.lower().startswith((b'proxy-', b'connection:', b'keep-alive:'))]
+    tail = b'\r\n'.join(headers + [b'Connection: close']) + b'\r\n\r\n'
+    return url.hostname, port, (b' '.join((method, target, version)) + b'\r\n' + tail,
+                                b' '.join((method, path.encode('latin-1'), version)) + b'\r\n' + tail)
+
+
+class ProxyGateway:
+    def __init__(self, checker, host='127.0.0.1', port=8888, max_connections=8, retries=2, connect_timeout=5.0,
+                 idle_timeout=60.0, max_clients=1024, view='live', refresh_interval=1.0):
+        self.checker = checker
+        self.host = host
+        self.port = port
+        self.retries = retries
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self.view = view
+        self.refresh_interval = refresh_interval
+        self.balancer = UpstreamBalancer(max_connections)
+        self.clients = 0
+        self._store_version = None
+        self._refreshed = 0.0
+        self._client_slots = None
+
+    def stats(self):
+        with self.balancer.lock:
+            return {
+                "clients": self.clients,
+                "upstreams": len(self.balancer.entries),
+                "ejected": len(self.balancer.ejected),
+                "ejections": self.balancer.ejections
+            }
+
+    async def serve(self):
+        self._client_slots = asyncio.Semaphore(self.max_clients)
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        async with server:
+            await server.serve_forever()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._refreshed < self.refresh_interval:
+            return
+        self._refreshed = now
+        version, entries = self.checker.store.latencies(self.view, self._store_version)
+        if entries is not None:
+            self._store_version = version
+            self.balancer.refresh(entries)
+
+    async def _handle_client(self, reader, writer):
+        async with self._client_slots:
+            self.clients += 1
+            try:
+                outcome = await self._serve_client(reader, writer)
+            except Exception:
+                outcome = "error"
+            finally:
+                self.clients -= 1
+                writer.close()
+            METRICS.inc("proxy_gateway_connections_total", (("outcome", outcome),))
+
+    async def _serve_client(self, reader, writer):
         try:
-            with open(self.output_file, 'r') as f:
-                data = json.load(f)
-                return data.get("proxies", []), data.get("count", 0)
-        except:
-            return [], 0
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.idle_timeout)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            return "bad_request"
 
-    def reset_counters(self):
-        with self.lock:
-            self.checked_count = 0
-            self.valid_count = 0
-            self.scraped_count = 0
-            self.last_run = datetime.now()
+        request = _parse_gateway_request(head)
+        if request is None:
+            await self._reply(writer, 400, "Bad Request")
+            return "bad_request"
 
-    def check_single_proxy(self, proxy, proxy_types, retries=2, timeout=2):
-        is_valid = False
-        valid_type = None
+        host, port, payload = request
+        entry, upstream_reader, upstream_writer, attempts = await self._open_upstream(host, port, payload)
+        if entry is None:
+            if attempts:
+                await self._reply(writer, 502, "Bad Gateway")
+                return "failed"
+            await self._reply(writer, 503, "No Upstream Available")
+            return "no_upstream"
 
-        for proxy_type in proxy_types:
+        upload = None
+        received = 0
+        try:
+            if payload is None:
+                writer.write(b'HTTP/1.1 200 Connection Established\r\n\r\n')
+                await writer.drain()
+            upload = asyncio.ensure_future(self._pipe(reader, upstream_writer))
+            received = await self._pipe(upstream_reader, writer)
+        finally:
+            if upload:
+                upload.cancel()
+            upstream_writer.close()
+            failed = payload is not None and not received
+            if self.balancer.release(entry, rejected=failed):
+                self.checker.report_upstream_failure(entry)
+                METRICS.inc("proxy_gateway_upstream_failures_total", (("ejected", "true"),))
+        return "failed" if failed else "ok"
+
+    async def _open_upstream(self, host, port, payload):
+        self._refresh()
+        tried = set()
+        for _ in range(self.retries + 1):
+            entry = self.balancer.acquire(tried)
+            if entry is None:
+                break
+            tried.add(entry)
+
+            start = time.perf_counter()
             try:
-                for attempt in range(retries):
-                    try:
-                        proxies = {
-                            "http": f"{proxy_type}://{proxy}",
-                            "https": f"{proxy_type}://{proxy}"
-                        }
-                        with requests.Session() as session:
-                            session.trust_env = False
-                            response = session.get("http://httpbin.org/ip", 
-                                                  proxies=proxies, 
-                                                  timeout=timeout, 
-                                                  verify=False)
-                            if response.status_code == 200:
-                                is_valid = True
-                                valid_type = proxy_type
-                                break
-                    except (requests.exceptions.ConnectionError, 
-                           requests.exceptions.Timeout, 
-                           ConnectionResetError,
-                           requests.exceptions.ProxyError):
-                        if attempt < retries - 1:
-                            time.sleep(0.05)
-                        continue
-                    except Exception:
-                        break
-                if is_valid:
-                    break
+                upstream_reader, upstream_writer = await asyncio.wait_for(
+                    self._connect_via(entry, host, port, payload), self.connect_timeout)
+            except ConnectionRefusedError:
+                ejected = self.balancer.release(entry, failed=True)
             except Exception:
-                continue
+                ejected = self.balancer.release(entry, rejected=True)
+            else:
+                elapsed = time.perf_counter() - start
+                self.balancer.observe(entry, elapsed)
+                METRICS.observe("proxy_gateway_connect_duration_seconds", elapsed)
+                return entry, upstream_reader, upstream_writer, len(tried)
 
-        if is_valid:
-            proxy_entry = f"{valid_type}://{proxy}"
-            self._add_proxy_to_file(proxy_entry)
+            if ejected:
+                self.checker.report_upstream_failure(entry)
+            METRICS.inc("proxy_gateway_upstream_failures_total", (("ejected", "true" if ejected else "false"),))
+        return None, None, None, len(tried)
 
-            with self.file_lock:
-                with open("Valid_Proxies.txt", "a", buffering=1) as f:
-                    f.write(f"{proxy_entry}\n")
+    async def _connect_via(self, entry, host, port, payload):
+        proxy_type, address = entry.split("://", 1)
+        proxy_host, proxy_port = address.rsplit(':', 1)
+        ssl_context = _insecure_ssl_context() if proxy_type == 'https' else None
+        reader, writer = await asyncio.open_connection(proxy_host, int(proxy_port), ssl=ssl_context)
+        try:
+            if proxy_type in ('http', 'https') and payload is not None:
+                writer.write(payload[0])
+                await writer.drain()
+                return reader, writer
 
-            with self.lock:
-                self.valid_count += 1
+            if proxy_type in ('http', 'https'):
+                await _async_http_connect(reader, writer, host, port, self.connect_timeout)
+            elif proxy_type == 'socks4':
+                await _async_socks4_handshake(reader, writer, await self._resolve(host, port), port, self.connect_timeout)
+            else:
+                await _async_socks5_handshake(reader, writer, host, port, self.connect_timeout)
 
-        with self.lock:
-            self.checked_count += 1
-            if self.checked_count % 10 == 0:
-                print(f'\rChecked: {self.checked_count}/{self.scraped_count} | Valid: {self.valid_count}', 
-                      end='', flush=True)
+            if payload is not None:
+                writer.write(payload[1])
+                await writer.drain()
+            return reader, writer
+        except BaseException:
+            writer.close()
+            raise
 
-        return is_valid, valid_type if is_valid else None
+    async def _resolve(self, host, port):
+        try:
+            socket.inet_aton(host)
+            return host
+        except OSError:
+            pass
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, family=socket.AF_INET, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise TargetUnreachable(str(e))
+        return infos[0][4][0]
 
-    def check_proxy_batch(self, proxy, proxy_types, save_invalid, semaphore):
-        is_valid = False
-        with semaphore:
-            for proxy_type in proxy_types:
-                try:
-                    for attempt in range(2):
-                        try:
-                            proxies = {
-                                "http": f"{proxy_type}://{proxy}",
-                                "https": f"{proxy_type}://{proxy}"
-                            }
-                            with requests.Session() as session:
-                                session.trust_env = False
-                                response = session.get("http://httpbin.org/ip", 
-                                                     proxies=proxies, 
-                                                     timeout=2, 
-                                                     verify=False)
-                                if response.status_code == 200:
-                                    is_valid = True
-
-                                    proxy_entry = f"{proxy_type}://{proxy}"
-                                    self._add_proxy_to_file(proxy_entry)
-
-                                    with self.file_lock:
-                                        with open("Valid_Proxies.txt", "a", buffering=1) as f:
-                                            f.write(f"{proxy_entry}\n")
-
-                                    with self.lock:
-                                        self.valid_count += 1
-                                    break
-                        except (requests.exceptions.ConnectionError, 
-                               requests.exceptions.Timeout, 
-                               ConnectionResetError,
-                               requests.exceptions.ProxyError):
-                            if attempt < 1:
-                                time.sleep(0.05)
-                            continue
-                        except Exception:
-                            break
-                    if is_valid:
-                        break
-                except Exception:
-                    continue
+    async def _pipe(self, reader, writer):
+        total = 0
+        try:
+            while True:
+                data = await asyncio.wait_for(reader.read(65536), self.idle_timeout)
+                if not data:
+                    break
+                total += len(data)
+                writer.write(data)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        return total
 
-            if not is_valid and save_invalid:
-                with self.file_lock:
-                    with open("Invalid_Proxies.txt", "a", buffering=1) as f:
-                        f.write(f"{proxy}\n")
+    async def _reply(self, writer, status, reason):
+        try:
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
 
-            with self.lock:
-                self.checked_count += 1
-                if self.checked_count % 10 == 0:
-                    print(f'\rChecked: {self.checked_count}/{self.scraped_count} | Valid: {self.valid_count}', 
-                          end='', flush=True)
 
-    def scrape_proxies(self, urls):
-        print("\n[Status] Scraping Proxies...")
-        proxies = set()
-        ip_port_pattern = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}:\d{2,5}$')
+def start_gateway(port, checker, max_connections=8, retries=2, connect_timeout=5.0, host='127.0.0.1'):
+    _raise_fd_limit()
+    gateway = ProxyGateway(checker, host=host, port=port, max_connections=max_connections, retries=retries,
+                           connect_timeout=connect_timeout)
+    checker.gateway = gateway
+    print(f"[Gateway] Forward proxy on http://{host}:{port} (HTTP and CONNECT, up to {max_connections} connections per upstream)")
+    asyncio.run(gateway.serve())
 
-        for url in urls:
-            for attempt in range(2):
-                try:
-                    response = requests.get(url, timeout=10, verify=False)
-                    if response.status_code == 200:
-                        for line in response.text.splitlines():
-                            line = line.strip()
-                            if ip_port_pattern.match(line) and not line.startswith("127"):
-                                proxies.add(line)
-                        break
-                except Exception:
-                    if attempt < 1:
-                        time.sleep(0.2)
-                    continue
 
-        return proxies
+MAX_BATCH_BODY = 16 * 1024 * 1024
 
-    def check_from_file(self, filepath, proxy_types, save_invalid):
-        print(f"\n[Status] Checking proxies from {filepath}...")
 
-        with open(filepath, "r") as file:
-            proxies = [line.strip() for line in file if line.strip()]
+class ProxyAPI:
+    BLOCKING_PATHS = ('/check_proxy', '/check_batch', '/health', '/lease', '/results')
 
-        self.scraped_count = len(proxies)
-        self._process_proxy_batch(proxies, proxy_types, save_invalid)
+    def __init__(self, checker):
+        self.checker = checker
+        self.routes = {
+            ('GET', '/get_proxies'): self._get_proxies,
+            ('GET', '/check_proxy'): self._check_proxy,
+            ('GET', '/health'): self._health,
+            ('GET', '/sources'): self._sources,
+            ('GET', '/metrics'): self._metrics,
+            ('GET', '/stats'): self._stats,
+            ('GET', '/judge'): self._judge,
+            ('POST', '/check_batch'): self._check_batch,
+            ('POST', '/lease'): self._lease,
+            ('POST', '/results'): self._lease
+        }
 
-        print(f'\n\nChecking complete! Total: {self.checked_count}, Valid: {self.valid_count}')
+    def is_blocking(self, target):
+        return urlparse(target).path in self.BLOCKING_PATHS
 
-    def scrape_and_check(self, urls, proxy_types, save_invalid):
-        proxies = self.scrape_proxies(urls)
-        self.scraped_count = len(proxies)
-        print(f"\n[Status] Found {self.scraped_count} proxies. Checking...")
+    def handle(self, method, target, headers, body=None, client=None):
+        try:
+            parsed_path = urlparse(target)
+            route = self.routes.get((method, parsed_path.path))
+            if route is None:
+                return self._json(404, {'error': 'Not found'})
+            response = route(parsed_path.path, parse_qs(parsed_path.query), headers, body, client)
+        except Exception:
+            return self._json(500, {'error': 'Internal error'})
+        return self._negotiate(response, headers)
 
-        proxy_list = list(proxies)
-        self._process_proxy_batch(proxy_list, proxy_types, save_invalid)
+    def _json(self, status, payload, extra_headers=()):
+        return status, [('Content-type', 'application/json')] + list(extra_headers), \
+            json.dumps(payload, separators=(',', ':')).encode()
 
-        print(f'\n\nScraping and checking complete! Total: {self.checked_count}, Valid: {self.valid_count}')
+    def _negotiate(self, response, headers):
+        status, response_headers, body = response
+        if (not isinstance(body, bytes) or len(body) < 1024 or 'gzip' not in headers.get('accept-encoding', '')
+                or any(name == 'Content-Encoding' for name, value in response_headers)):
+            return response
+        return status, response_headers + [('Content-Encoding', 'gzip'), ('Vary', 'Accept-Encoding')], \
+            gzip.compress(body, 6)
 
-    def _process_proxy_batch(self, proxies, proxy_types, save_invalid):
-        semaphore = BoundedSemaphore(self.max_threads)
-        threads = []
+    def _get_proxies(self, path, query_params, headers, body, client):
+        try:
+            proxy_type = query_params.get('type', [None])[0]
+            offset = max(0, int(query_params.get('offset', ['0'])[0]))
+            limit = query_params.get('limit', [None])[0]
+            limit = max(0, int(limit)) if limit is not None else None
+            max_latency = query_params.get('max_latency', [None])[0]
+            max_latency = float(max_latency) / 1000 if max_latency is not None else None
+            sort = query_params.get('sort', [None])[0]
+            if sort not in (None, 'latency'):
+                raise ValueError(sort)
+            view = query_params.get('view', ['published'])[0]
+            if view not in ('published', 'live'):
+                raise ValueError(view)
+            filters = []
+            anonymity = query_params.get('anonymity', [None])[0]
+            if anonymity is not None:
+                levels = tuple(sorted(set(anonymity.split(','))))
+                if not set(levels) <= set(ANONYMITY_LEVELS):
+                    raise ValueError(anonymity)
+                filters.append(('anonymity', levels))
+            tunnel = query_params.get('tunnel', [None])[0]
+            if tunnel is not None:
+                if tunnel not in ('0', '1', 'true', 'false'):
+                    raise ValueError(tunnel)
+                filters.append(('tunnel', (True,) if tunnel in ('1', 'true') else (False, None)))
+            country = query_params.get('country', [None])[0]
+            if country is not None:
+                filters.append(('country', tuple(sorted(set(country.upper().split(','))))))
+            asn = query_params.get('asn', [None])[0]
+            if asn is not None:
+                filters.append(('asn', tuple(sorted(set(_parse_asns(asn))))))
+            details = query_params.get('details', ['0'])[0] in ('1', 'true')
+        except ValueError:
+            return self._json(400, {'error': 'Invalid filter parameter'})
 
-        batch_size = 500
-        for i in range(0, len(proxies), batch_size):
-            batch = proxies[i:i+batch_size]
+        compress = 'gzip' in headers.get('accept-encoding', '')
+        etag, payload = self.checker.store.encoded(proxy_type, max_latency, offset, limit, compress, sort,
+                                                   'live' if view == 'live' else None, tuple(filters) or None, details)
+        if etag in headers.get('if-none-match', ''):
+            return 304, [('ETag', etag)], b''
 
-            for proxy in batch:
-                thread = threading.Thread(target=self.check_proxy_batch, 
-                                        args=(proxy, proxy_types, save_invalid, semaphore),
-                                        daemon=True)
-                threads.append(thread)
-                thread.start()
+        response_headers = [
+            ('Content-type', 'application/json'),
+            ('ETag', etag),
+            ('Cache-Control', 'no-cache'),
+            ('Vary', 'Accept-Encoding')
+        ]
+        if compress:
+            response_headers.append(('Content-Encoding', 'gzip'))
+        return 200, response_headers, payload
 
-            if i + batch_size < len(proxies):
-                for thread in threads[-len(batch):]:
-                    thread.join()
+    def _judge(self, path, query_params, headers, body, client):
+        return self._json(200, {'origin': client or '', 'headers': {name: value for name, value in headers.items()}})
 
-        for thread in threads:
-            thread.join()
+    def _check_proxy(self, path, query_params, headers, body, client):
+        proxy_param = query_params.get('check_proxy', [None])[0]
+        if not proxy_param:
+            return self._json(400, {'error': 'Missing check_proxy parameter'})
+        if not self.checker:
+            return self._json(500, {'error': 'Checker not initialized'})
 
+        proxy_types = ["http", "https", "socks4", "socks5"]
+        fresh = query_params.get('fresh', ['0'])[0] in ('1', 'true')
 
-class ProxyHTTPHandler(BaseHTTPRequestHandler):
-    checker = None
+        def check():
+            print(f"\n[API] Checking proxy: {proxy_param}")
+            return self.checker.check_single_proxy(proxy_param, proxy_types)
 
-    def log_message(self, format, *args):
-        pass
+        (is_valid, valid_type), checked_at, cached = self.checker.check_cache.get_or_check(proxy_param, check, fresh)
+        return self._json(200, {
+            'proxy': proxy_param,
+            'valid': is_valid,
+            'type': valid_type,
+            'cached': cached,
+            'age': round(time.time() - checked_at, 3)
+        })
 
-    def do_GET(self):
+    def _health(self, path, query_params, headers, body, client):
+        if not self.checker or not self.checker.db:
+            return self._json(404, {'error': 'Health database not enabled (use --db)'})
+
+        view = query_params.get('view', ['valid'])[0]
+        proxy_type = query_params.get('type', [None])[0]
         try:
-            parsed_path = urlparse(self.path)
+            limit = max(0, int(query_params.get('limit', ['100'])[0]))
+            hours = float(query_params.get('hours', ['24'])[0])
+        except ValueError:
+            return self._json(400, {'error': 'Invalid filter parameter'})
+        if view == 'fastest':
+            rows = self.checker.db.fastest(limit, proxy_type)
+        elif view == 'uptime':
+            rows = self.checker.db.uptime(hours, limit)
+        else:
+            rows = self.checker.db.valid_now(proxy_type, limit)
+        return self._json(200, {'view': view, 'count': len(rows), 'proxies': rows})
 
-            if parsed_path.path == '/get_proxies':
-                try:
-                    with open(self.checker.output_file, 'r') as f:
-                        data = json.load(f)
-
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Connection', 'close')
-                    self.end_headers()
-
-                    self.wfile.write(json.dumps(data, separators=(',', ':')).encode())
-                except Exception as e:
-                    self.send_response(500)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Connection', 'close')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({'error': str(e)}).encode())
-
-            elif parsed_path.path == '/check_proxy':
-                query_params = parse_qs(parsed_path.query)
-                proxy_param = query_params.get('check_proxy', [None])[0]
-
-                if not proxy_param:
-                    self.send_response(400)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Connection', 'close')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({'error': 'Missing check_proxy parameter'}).encode())
-                    return
+    def _sources(self, path, query_params, headers, body, client):
+        if not self.checker or not self.checker.source_stats:
+            return self._json(404, {'error': 'Source stats are disabled'})
+        return self._json(200, self.checker.source_stats.report())
 
-                print(f"\n[API] Checking proxy: {proxy_param}")
-                proxy_types = ["http", "https", "socks4", "socks5"]
+    def _metrics(self, path, query_params, headers, body, client):
+        payload = METRICS.render(self.checker.metric_gauges() if self.checker else ()).encode()
+        return 200, [('Content-type', 'text/plain; version=0.0.4; charset=utf-8')], payload
 
-                if self.checker:
-                    is_valid, valid_type = self.checker.check_single_proxy(proxy_param, proxy_types)
+    def _stats(self, path, query_params, headers, body, client):
+        stats = {
+            'checked': self.checker.checked_count if self.checker else 0,
+            'valid': self.checker.valid_count if self.checker else 0,
+            'total': self.checker.scraped_count if self.checker else 0,
+            'output_file': self.checker.output_file if self.checker else None,
+            'last_run': self.checker.last_run.isoformat() if self.checker and self.checker.last_run else None
+        }
+        if self.checker:
+            stats['generation'] = self.checker.store.generation_stats()
+        if self.checker and self.checker.lease_queue:
+            stats['leases'] = self.checker.lease_queue.stats()
+        if self.checker and self.checker.controller:
+            stats['adaptive'] = self.checker.controller.stats()
+        if self.checker and self.checker.gateway:
+            stats['gateway'] = self.checker.gateway.stats()
+        return self._json(200, stats)
 
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Connection', 'close')
-                    self.end_headers()
+    def _check_batch(self, path, query_params, headers, body, client):
+        if not self.checker or not body:
+            error = 'Checker not initialized' if not self.checker else \
+                f'Body must be a newline-delimited proxy list of at most {MAX_BATCH_BODY} bytes'
+            return self._json(400 if self.checker else 500, {'error': error})
 
-                    response = {
-                        'proxy': proxy_param,
-                        'valid': is_valid,
-                        'type': valid_type
-                    }
-                    self.wfile.write(json.dumps(response, separators=(',', ':')).encode())
-                else:
-                    self.send_response(500)
-                    self.send_header('Content-type', 'application/json')
-                    self.send_header('Connection', 'close')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({'error': 'Checker not initialized'}).encode())
-
-            elif parsed_path.path == '/stats':
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Connection', 'close')
-                self.end_headers()
+        text = body.decode('utf-8', errors='ignore')
+        proxies = list(dict.fromkeys(line.strip() for line in text.splitlines() if line.strip()))
+        proxy_types = [t for t in query_params.get('type', ['http,https,socks4,socks5'])[0].split(',')
+                       if t in ('http', 'https', 'socks4', 'socks5')]
+        try:
+            concurrency = int(query_params.get('concurrency', ['50'])[0])
+        except ValueError:
+            concurrency = 50
+
+        print(f"\n[API] Batch check of {len(proxies)} proxies (concurrency {concurrency})")
+        results = self.checker.iter_check_results(proxies, proxy_types, concurrency)
+        return 200, [('Content-type', 'application/x-ndjson'), ('Cache-Control', 'no-cache')], \
+            self._stream_batch(results)
 
-                stats = {
-                    'checked': self.checker.checked_count if self.checker else 0,
-                    'valid': self.checker.valid_count if self.checker else 0,
-                    'total': self.checker.scraped_count if self.checker else 0,
-                    'output_file': self.checker.output_file if self.checker else None,
-                    'last_run': self.checker.last_run.isoformat() if self.checker and self.checker.last_run else None
+    def _stream_batch(self, results):
+        try:
+            for proxy, valid_type, timings in results:
+                line = {
+                    'proxy': proxy,
+                    'valid': valid_type is not None,
+                    'type': valid_type,
+                    'timings': {key: round(timings[key], 4) for key in TIMING_KEYS
+                                if timings.get(key) is not None} if timings else None
                 }
-                self.wfile.write(json.dumps(stats, separators=(',', ':')).encode())
+                if timings:
+                    line.update((key, timings[key]) for key in PROFILE_KEYS if key in timings)
+                yield json.dumps(line, separators=(',', ':')).encode() + b'\n'
+        except OSError as e:
+            print(f"\n[Error] Batch check aborted: {e}")
+            yield json.dumps({'error': f'Judge unavailable: {e}'}, separators=(',', ':')).encode() + b'\n'
+        finally:
+            results.close()
 
-            else:
-                self.send_response(404)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Connection', 'close')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': 'Not found'}).encode())
+    def _lease(self, path, query_params, headers, body, client):
+        token = self.checker.lease_token if self.checker else None
+        if not token or not hmac.compare_digest(headers.get('x-lease-token', '').encode(), token.encode()):
+            return self._json(403, {'error': 'Invalid lease token'})
+        try:
+            payload = json.loads(body or b'{}') if body is not None else None
+            if not isinstance(payload, dict):
+                raise ValueError('Body must be a JSON object')
+        except ValueError as e:
+            return self._json(400, {'error': str(e)})
+
+        lease_queue = self.checker.lease_queue if self.checker else None
+        if path == '/lease':
+            lease = lease_queue.lease(payload.get('worker'), payload.get('size')) if lease_queue else None
+            return self._json(200, lease or {'lease_id': None, 'retry_after': 5})
+
+        accepted, expired = self.checker.submit_lease_results(
+            payload.get('lease_id'), payload.get('results', []), bool(payload.get('final')))
+        return self._json(200, {'accepted': accepted, 'expired': expired})
+
+
+class ProxyHTTPHandler(BaseHTTPRequestHandler):
+    api = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        try:
+            body = None
+            if method == 'POST':
+                length = int(self.headers.get('Content-Length', 0) or 0)
+                body = self.rfile.read(length) if length <= MAX_BATCH_BODY else None
+
+            status, headers, payload = self.api.handle(method, self.path, self.headers, body, self.client_address[0])
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            if isinstance(payload, bytes) and status != 304:
+                self.send_header('Content-Length', str(len(payload)))
+            self.send_header('Connection', 'close')
+            self.end_headers()
+
+            if isinstance(payload, bytes):
+                self.wfile.write(payload)
+                return
+            try:
+                for chunk in payload:
+                    self.wfile.write(chunk)
+            finally:
+                payload.close()
 
         except (ConnectionAbortedError, BrokenPipeError, ConnectionResetError):
             pass
@@ -345,16 +3619,132 @@ class ProxyHTTPHandler(BaseHTTPRequestHandler):
                 pass
 
 
-def start_web_server(port, checker):
-    ProxyHTTPHandler.checker = checker
-    server = ThreadingHTTPServer(('0.0.0.0', port), ProxyHTTPHandler)
-    server.daemon_threads = True
-    print(f"\n[Web Server] Started on http://localhost:{port}")
+class AsyncAPIServer:
+    def __init__(self, api, host='0.0.0.0', port=8080, max_requests=256, blocking_workers=16, idle_timeout=30.0):
+        self.api = api
+        self.host = host
+        self.port = port
+        self.max_requests = max_requests
+        self.blocking_workers = blocking_workers
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self._slots = None
+        self._executor = None
+
+    async def serve(self):
+        self._slots = asyncio.Semaphore(self.max_requests)
+        self._executor = ThreadPoolExecutor(self.blocking_workers, thread_name_prefix='api')
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _handle_request(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.idle_timeout)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+            return False
+
+        lines = head[:-4].decode('latin-1').split('\r\n')
+        parts = lines[0].split()
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            method, target, version = parts
+            length = int(headers.get('content-length', 0) or 0)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            await self._write(writer, 400, [('Content-type', 'application/json')], b'{"error":"Bad request"}', False)
+            return False
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        if length > MAX_BATCH_BODY:
+            body = None
+            keep_alive = False
+        else:
+            body = await asyncio.wait_for(reader.readexactly(length), self.idle_timeout) if length else b''
+
+        loop = asyncio.get_running_loop()
+        client = (writer.get_extra_info('peername') or ('',))[0]
+        async with self._slots:
+            if self.api.is_blocking(target):
+                status, response_headers, payload = await loop.run_in_executor(
+                    self._executor, self.api.handle, method, target, headers, body, client)
+            else:
+                status, response_headers, payload = self.api.handle(method, target, headers, body, client)
+
+            if isinstance(payload, bytes):
+                await self._write(writer, status, response_headers, payload, keep_alive)
+                return keep_alive
+
+            await self._write(writer, status, response_headers, None, False)
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(self._executor, next, payload, None)
+                    if chunk is None:
+                        break
+                    writer.write(chunk)
+                    await writer.drain()
+            finally:
+                await loop.run_in_executor(self._executor, payload.close)
+            return False
+
+    async def _write(self, writer, status, headers, payload, keep_alive):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if payload is not None and status != 304:
+            lines.append(f"Content-Length: {len(payload)}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + (payload or b''))
+        await writer.drain()
+
+
+def start_web_server(port, checker, server_type='thread', max_requests=256):
+    api = ProxyAPI(checker)
+    if server_type == 'async':
+        server = AsyncAPIServer(api, port=port, max_requests=max_requests)
+        print(f"\n[Web Server] Started on http://localhost:{port} (asyncio, keep-alive, {max_requests} requests in flight)")
+    else:
+        ProxyHTTPHandler.api = api
+        server = ThreadingHTTPServer(('0.0.0.0', port), ProxyHTTPHandler)
+        server.daemon_threads = True
+        print(f"\n[Web Server] Started on http://localhost:{port}")
     print(f"[Web Server] Endpoints:")
     print(f"  - GET /get_proxies - Get all valid proxies from {checker.output_file}")
-    print(f"  - GET /check_proxy?check_proxy=IP:PORT - Check a specific proxy")
+    print(f"    (filters: type=, limit=, offset=, max_latency=MS, sort=latency; supports ETag/If-None-Match and gzip)")
+    print(f"    (serves the last complete generation while a cycle runs; view=live merges in new results)")
+    print(f"    (anonymity=transparent|anonymous|elite, tunnel=1 for CONNECT support, details=1 for per-proxy attributes)")
+    if checker.geo is not None:
+        print(f"    (country=CC[,CC] and asn=N[,N] from the --geo-db range index)")
+    print(f"  - GET /check_proxy?check_proxy=IP:PORT - Check a specific proxy (fresh=1 bypasses the cache)")
     print(f"  - GET /stats - Get current statistics")
-    server.serve_forever()
+    print(f"  - GET /judge - Echo the caller's address and headers (bundled judge for --judge local)")
+    if checker.source_stats:
+        print(f"  - GET /sources - Per-source fetch time, unique contribution and valid yield")
+    print(f"  - GET /metrics - Prometheus metrics for checks, queues, sources and persistence")
+    print(f"  - POST /check_batch?concurrency=N - Check a newline-delimited list, streamed back as NDJSON")
+    if checker.role == 'coordinator':
+        print(f"  - POST /lease, POST /results - Hand out and collect work chunks for --role worker")
+    if checker.db:
+        print(f"  - GET /health?view=valid|fastest|uptime - Query the proxy health database")
+    if server_type == 'async':
+        asyncio.run(server.serve())
+    else:
+        server.serve_forever()
 
 
 def get_default_urls(proxy_type):
@@ -546,36 +3936,23 @@ def get_default_urls(proxy_type):
             ]
 
     if proxy_type.lower() in ['http', 'https']:
-        return http_list
+        selected = http_list
     elif proxy_type.lower() == 'socks4':
-        return socks4_list
+        selected = socks4_list
     elif proxy_type.lower() == 'socks5':
-        return socks5_list
+        selected = socks5_list
     else:
-        return urls
+        selected = urls
+    return list(dict.fromkeys(selected))
 
 
 
 def run_check_cycle(checker, args, proxy_types):
-    checker._initialize_output_file()
-
-    with open("Valid_Proxies.txt", "w") as f:
-        f.write("")
-    if args.save_invalid:
-        with open("Invalid_Proxies.txt", "w") as f:
-            f.write("")
-
+    if checker.store.begin_generation(clear_invalid=args.save_invalid):
+        print(f"[Status] Serving generation {checker.store.published['generation']} while generation {checker.store.generation} is built")
     checker.reset_counters()
-
-    with checker.file_lock:
-        try:
-            with open(checker.output_file, 'r') as f:
-                data = json.load(f)
-            data['last_check'] = datetime.now().isoformat()
-            with open(checker.output_file, 'w') as f:
-                json.dump(data, f, separators=(',', ':'))
-        except:
-            pass
+    checker.store.set_last_check(datetime.now().isoformat())
+    checker.store.flush()
 
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"\n{'='*60}")
@@ -588,16 +3965,120 @@ def run_check_cycle(checker, args, proxy_types):
         urls = get_default_urls(args.proxy_type)
         checker.scrape_and_check(urls, proxy_types, args.save_invalid)
 
+    if not checker.store.commit_generation():
+        print(f"\n[Warning] Generation {checker.store.generation} found no valid proxies, keeping the previous one")
     print(f"\n[Success] Valid proxies saved to: {args.output}")
     print(f"[Success] Backup text file: Valid_Proxies.txt")
     if args.save_invalid:
         print(f"[Success] Invalid proxies: Invalid_Proxies.txt")
 
 
+def run_continuous(checker, args, proxy_types):
+    scheduler = RecheckScheduler(min_interval=args.min_interval * 60, max_interval=args.max_interval * 60)
+
+    checker._initialize_output_file(clear_invalid=args.save_invalid)
+    checker.reset_counters()
+    checker.store.set_last_check(datetime.now().isoformat())
+    checker.current_source = f"file:{args.file}" if args.mode == 'file' else "scrape"
+    checker.start_recheck_workers(scheduler, proxy_types, args.save_invalid)
+
+    while True:
+        if args.mode == 'file':
+            proxies = iter_proxy_file(args.file)
+        else:
+            proxies = checker.scrape_proxies(get_default_urls(args.proxy_type))
+
+        added = scheduler.add(proxies)
+        checker.scraped_count = len(scheduler)
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        print(f"\n[{timestamp}] [Scheduler] Added {added} new proxies ({checker.scraped_count} tracked)")
+
+        if args.repeat <= 0:
+            while True:
+                time.sleep(3600)
+        time.sleep(args.repeat * 3600)
+
+
+def _post_lease_results(session, url, token, lease_id, results, final, attempts=3):
+    for attempt in range(attempts):
+        try:
+            response = session.post(f"{url}/results", headers={"X-Lease-Token": token}, json={
+                "lease_id": lease_id,
+                "results": results,
+                "final": final
+            }, timeout=30)
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            if attempt == attempts - 1:
+                print(f"\n[Worker] Failed to post results: {e}")
+            time.sleep(1)
+    return None
+
+
+def run_worker(checker, args):
+    url = args.coordinator.rstrip('/')
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    session = requests.Session()
+    session.trust_env = False
+    print(f"\n[Worker] {worker_id} pulling work from {url}")
+
+    while True:
+        try:
+            lease = session.post(f"{url}/lease", headers={"X-Lease-Token": args.lease_token},
+                                 json={"worker": worker_id, "size": args.lease_size}, timeout=30).json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"\n[Worker] Coordinator unavailable: {e}")
+            time.sleep(5)
+            continue
+
+        if lease.get("error"):
+            print(f"\n[Worker] Coordinator refused the lease: {lease['error']}")
+        if not lease.get("lease_id"):
+            time.sleep(lease.get("retry_after", 5))
+            continue
+
+        checker.protocol_hints = lease.get("hints") or {}
+        if checker.judge_url != lease["judge_url"]:
+            checker.judge_url = lease["judge_url"]
+            checker.real_ip = None
+        batch = []
+        last_post = time.monotonic()
+        proxies = lease["proxies"]
+        if checker.prefilter:
+            proxies = []
+            for proxy, connected in iter_connect_results(lease["proxies"], checker.prefilter_timeout,
+                                                         checker.prefilter_concurrency):
+                if connected:
+                    proxies.append(proxy)
+                else:
+                    batch.append([proxy, None, None])
+            with checker.lock:
+                checker.checked_count += len(batch)
+
+        try:
+            for proxy, valid_type, timings in checker.iter_check_results(proxies, lease["proxy_types"]):
+                batch.append([proxy, valid_type, timings])
+                with checker.lock:
+                    checker.checked_count += 1
+                    if valid_type:
+                        checker.valid_count += 1
+                if len(batch) >= 100 or time.monotonic() - last_post >= 2:
+                    _post_lease_results(session, url, args.lease_token, lease["lease_id"], batch, False)
+                    batch = []
+                    last_post = time.monotonic()
+        except OSError as e:
+            print(f"\n[Worker] Abandoning lease {lease['lease_id']}: {e}")
+            time.sleep(5)
+            continue
+
+        _post_lease_results(session, url, args.lease_token, lease["lease_id"], batch, True)
+        print(f'\r[Worker] Checked: {checker.checked_count} | Valid: {checker.valid_count}', end='', flush=True)
+
+
 def main():
     parser = argparse.ArgumentParser(description='High-Performance Proxy Checker with JSON Output and Scheduling')
-    parser.add_argument('-m','--mode', choices=['file', 'scrape'], required=True,
-                       help='Mode: check from file or scrape and check')
+    parser.add_argument('-m','--mode', choices=['file', 'scrape'],
+                       help='Mode: check from file or scrape and check (not used with --role worker)')
     parser.add_argument('-f','--file', help='Path to proxy file (required for file mode)')
     parser.add_argument('-o','--output', default='proxies.json',
                        help='Output JSON file (default: proxies.json)')
@@ -607,16 +4088,120 @@ def main():
                        help='Save invalid proxies to file')
     parser.add_argument('-p','--port', type=int, default=8080,
                        help='Web server port (default: 8080)')
+    parser.add_argument('--gateway-port', type=int, default=0,
+                       help='Also serve a rotating HTTP/CONNECT forward proxy over the valid pool on this port (default: disabled)')
+    parser.add_argument('--gateway-host', default='127.0.0.1',
+                       help='Address the gateway listens on; it has no authentication, so only widen this on trusted networks (default: 127.0.0.1)')
+    parser.add_argument('--gateway-max-conns', type=int, default=8,
+                       help='Concurrent gateway connections routed through one upstream proxy (default: 8)')
+    parser.add_argument('--gateway-retries', type=int, default=2,
+                       help='Other upstreams tried when the chosen one fails before relaying (default: 2)')
+    parser.add_argument('--gateway-timeout', type=float, default=5.0,
+                       help='Seconds to open a tunnel through an upstream (default: 5)')
+    parser.add_argument('--api-server', choices=['thread', 'async'], default='thread',
+                       help='API server: a thread per request, or one asyncio loop with keep-alive (default: thread)')
+    parser.add_argument('--api-max-requests', type=int, default=256,
+                       help='Requests the async API server handles at once (default: 256)')
     parser.add_argument('-t','--threads', type=int, default=500,
                        help='Maximum concurrent threads (default: 500)')
+    parser.add_argument('-e','--engine', choices=['thread', 'async'], default='thread',
+                       help='Check engine: a thread pool or a single asyncio event loop (default: thread)')
+    parser.add_argument('-w','--workers', type=int, default=1,
+                       help='Shard checking across this many processes, each running its own engine '
+                            'with --threads concurrency (default: 1)')
+    parser.add_argument('--flush-size', type=int, default=500,
+                       help='Write results to disk after this many new entries (default: 500)')
+    parser.add_argument('--flush-interval', type=float, default=5.0,
+                       help='Write pending results to disk at least every X seconds (default: 5)')
+    parser.add_argument('--scrape-workers', type=int, default=16,
+                       help='Number of sources fetched concurrently in scrape mode (default: 16)')
+    parser.add_argument('--source-stats', default='source_stats.json',
+                       help='Per-source yield history used to skip unproductive sources (default: source_stats.json)')
+    parser.add_argument('--no-source-pruning', action='store_true',
+                       help='Keep tracking source yield but fetch every source each cycle')
+    parser.add_argument('--source-cache', default='source_cache.json',
+                       help='Per-source ETag/Last-Modified cache file (default: source_cache.json)')
+    parser.add_argument('--no-source-cache', action='store_true',
+                       help='Always re-download and re-parse every source')
+    parser.add_argument('--adaptive', action='store_true',
+                       help='Float in-flight checks below --threads (AIMD) and derive per-protocol timeouts from observed latency')
+    parser.add_argument('--race', action='store_true',
+                       help='Try the candidate protocols of a proxy concurrently and keep the first that answers '
+                            '(async engine only)')
+    parser.add_argument('--race-stagger', type=float, default=0.25,
+                       help='Seconds before the next protocol joins a race if none has finished (default: 0.25)')
+    parser.add_argument('--prefilter', action='store_true',
+                       help='Drop proxies that refuse or ignore a plain TCP connect before the full check')
+    parser.add_argument('--prefilter-timeout', type=float, default=1.0,
+                       help='Connect timeout for the prefilter in seconds (default: 1.0)')
+    parser.add_argument('--prefilter-concurrency', type=int, default=1024,
+                       help='Connects the prefilter keeps in flight (default: 1024)')
+    parser.add_argument('--no-sniff', action='store_true',
+                       help='Skip handshake-based protocol detection and try every proxy type in turn')
+    parser.add_argument('--geo-db',
+                       help='IP range CSV/TSV (start,end,country and/or ASN columns) used to tag proxies with '
+                            'country and ASN (default: disabled)')
+    parser.add_argument('--country',
+                       help='Comma-separated country codes; scraped proxies outside them are never checked '
+                            '(requires --geo-db, default: all)')
+    parser.add_argument('--asn',
+                       help='Comma-separated ASNs; scraped proxies outside them are never checked '
+                            '(requires --geo-db, default: all)')
+    parser.add_argument('--judge', default='http://httpbin.org/get',
+                       help='Judge URL echoing the origin and request headers as JSON, or "local" for this '
+                            "server's own /judge endpoint (default: http://httpbin.org/get)")
+    parser.add_argument('-c','--continuous', action='store_true',
+                       help='Re-check each proxy on its own adaptive schedule instead of full cycles '
+                            '(--repeat then sets how often sources are reloaded)')
+    parser.add_argument('--min-interval', type=float, default=5,
+                       help='Shortest re-check interval in minutes for continuous mode (default: 5)')
+    parser.add_argument('--max-interval', type=float, default=360,
+                       help='Longest re-check interval in minutes for stable proxies (default: 360)')
+    parser.add_argument('--db',
+                       help='Record every check in this SQLite health database (default: disabled)')
+    parser.add_argument('--check-cache-ttl', type=float, default=60,
+                       help='Seconds a /check_proxy result is reused before re-checking (default: 60)')
+    parser.add_argument('--role', choices=['standalone', 'coordinator', 'worker'], default='standalone',
+                       help='Run alone, hand out work over HTTP to workers, or pull work from a coordinator')
+    parser.add_argument('--coordinator',
+                       help='Coordinator base URL for --role worker (e.g. http://10.0.0.1:8080)')
+    parser.add_argument('--lease-size', type=int, default=500,
+                       help='Proxies per leased work chunk (default: 500)')
+    parser.add_argument('--lease-timeout', type=int, default=120,
+                       help='Seconds without progress before a lease is re-queued (default: 120)')
+    parser.add_argument('--lease-token',
+                       help='Shared secret workers send to /lease and /results (default: generated by the coordinator)')
     parser.add_argument('-r','--repeat', type=int, default=0,
                        help='Repeat check every X hours (0=run once, default: 0)')
 
     args = parser.parse_args()
 
+    if args.role == 'worker' and not args.coordinator:
+        print("Error: --coordinator is required for worker role")
+        sys.exit(1)
+    if args.role != 'worker' and not args.mode:
+        print("Error: --mode is required")
+        sys.exit(1)
     if args.mode == 'file' and not args.file:
         print("Error: --file is required for file mode")
         sys.exit(1)
+    if args.role == 'worker' and not args.lease_token:
+        print("Error: --lease-token is required for worker role")
+        sys.exit(1)
+    if (args.country or args.asn) and not args.geo_db:
+        print("Error: --country and --asn require --geo-db")
+        sys.exit(1)
+    if args.geo_db and not os.path.isfile(args.geo_db):
+        print(f"Error: geo database {args.geo_db} not found")
+        sys.exit(1)
+    if args.continuous and args.prefilter:
+        print("Error: --prefilter screens whole cycles and cannot be combined with --continuous")
+        sys.exit(1)
+    try:
+        asns = _parse_asns(args.asn) if args.asn else None
+    except ValueError as e:
+        print(f"Error: invalid --asn value {e}")
+        sys.exit(1)
 
     if args.proxy_type in ['http', 'https']:
         proxy_types = ['http', 'https']
@@ -627,14 +4212,77 @@ def main():
     else:
         proxy_types = ['http', 'https', 'socks4', 'socks5']
 
-    checker = ProxyChecker(output_file=args.output, max_threads=args.threads)
+    checker = ProxyChecker(output_file=None if args.role == 'worker' else args.output, max_threads=args.threads, engine=args.engine,
+                           workers=args.workers, role=args.role,
+                           flush_size=args.flush_size, flush_interval=args.flush_interval,
+                           scrape_workers=args.scrape_workers,
+                           source_cache_file=None if args.no_source_cache else args.source_cache,
+                           sniff=not args.no_sniff, db_file=args.db,
+                           check_cache_ttl=args.check_cache_ttl,
+                           source_stats_file=args.source_stats if args.mode == 'scrape' else None,
+                           source_pruning=not args.no_source_pruning,
+                           prefilter=args.prefilter, prefilter_timeout=args.prefilter_timeout,
+                           prefilter_concurrency=args.prefilter_concurrency, adaptive=args.adaptive,
+                           race=args.race, race_stagger=args.race_stagger, geo_db=args.geo_db,
+                           countries=args.country.split(',') if args.country else None, asns=asns)
+
+    checker.lease_size = args.lease_size
+    checker.lease_timeout = args.lease_timeout
+    if args.role == 'coordinator':
+        checker.lease_token = args.lease_token or secrets.token_urlsafe(24)
+    checker.judge_url = f"http://127.0.0.1:{args.port}/judge" if args.judge == 'local' else args.judge
+
+    if args.role == 'worker':
+        print(f"[Config] Role: worker | Max threads: {args.threads} | Engine: {args.engine}")
+        try:
+            run_worker(checker, args)
+        except KeyboardInterrupt:
+            print("\n\nShutting down...")
+            sys.exit(0)
 
-    server_thread = threading.Thread(target=start_web_server, args=(args.port, checker), daemon=True)
+    server_thread = threading.Thread(target=start_web_server,
+                                     args=(args.port, checker, args.api_server, args.api_max_requests), daemon=True)
     server_thread.start()
+    if args.gateway_port:
+        gateway_thread = threading.Thread(target=start_gateway,
+                                          args=(args.gateway_port, checker, args.gateway_max_conns,
+                                                args.gateway_retries, args.gateway_timeout, args.gateway_host),
+                                          daemon=True)
+        gateway_thread.start()
 
     print(f"[Config] Output file: {args.output}")
     print(f"[Config] Proxy type: {args.proxy_type}")
     print(f"[Config] Max threads: {args.threads}")
+    print(f"[Config] Engine: {args.engine}")
+    if args.race and args.engine != 'async':
+        print(f"[Warning] --race only applies to the async engine; the thread engine tries protocols in turn")
+    print(f"[Config] Judge: {checker.judge_url}")
+    if checker.geo is not None:
+        print(f"[Config] Geo ranges: {len(checker.geo)} from {args.geo_db} "
+              f"({'numpy' if numpy is not None else 'array'} index)")
+        if checker.countries or checker.asns:
+            print(f"[Config] Geo filter: countries {','.join(sorted(checker.countries or ())) or 'any'} | "
+                  f"ASNs {','.join(map(str, sorted(checker.asns or ()))) or 'any'}")
+    if args.workers > 1:
+        print(f"[Config] Worker processes: {args.workers}")
+    if args.adaptive:
+        print(f"[Config] Adaptive concurrency: up to {checker.controller.max_limit} in flight")
+    if args.role == 'coordinator':
+        print(f"[Config] Role: coordinator | Lease size: {args.lease_size} | Lease timeout: {args.lease_timeout}s")
+        if not args.lease_token:
+            print(f"[Config] Lease token: {checker.lease_token} (pass it to workers with --lease-token)")
+    if args.continuous:
+        if args.workers > 1:
+            print(f"[Warning] --workers is ignored in continuous mode")
+        print(f"[Config] Mode: Continuous (re-check every {args.min_interval}-{args.max_interval} minutes)")
+        print(f"\n[Web Server] Running on port {args.port}. Press Ctrl+C to stop.")
+        try:
+            run_continuous(checker, args, proxy_types)
+        except KeyboardInterrupt:
+            print("\n\nShutting down...")
+            checker.store.flush()
+            sys.exit(0)
+
     if args.repeat > 0:
         print(f"[Config] Repeat every: {args.repeat} hours")
     else: